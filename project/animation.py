@@ -1,27 +1,68 @@
 from pathlib import Path
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import QTimer, pyqtSignal, QObject
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtCore import pyqtSignal, QObject, QRect, Qt
+from collections import deque
+import json
+import math
 import random
+import time
+
+from frame_cache import FrameCache
+from frame_loader import (FrameLoader, decode_source, scale_frame, trim_frame, frame_rect,
+                          with_digest, with_mask, PackedFrame,
+                          PRIORITY_CURRENT, PRIORITY_LOOKAHEAD, PRIORITY_PREFETCH)
+from frame_store import FrameStore, STORE_FORMAT
+from hit_mask import HitMask, HitMaskCache
+from process_stats import percentile
+from scheduler import scheduler
 
 class Animation:
-    def __init__(self, name: str, frames: list, loop: bool = True):
+    def __init__(self, name: str, files: list, loop: bool = True, loader=None, fps: float = None):
         self.name = name
-        self.frames = frames
+        self.files = files
         self.loop = loop
+        self.fps = fps  # 动作自己的帧率（来自 meta.json），None 表示使用管理器的默认帧率
         self.current_frame = 0
+        self.loader = loader  # loader(animation, index) -> QImage，帧尚未解码完成时返回 None
+    
+    @property
+    def frame_count(self) -> int:
+        return len(self.files)
+    
+    def get_frame(self):
+        if not self.files:
+            return QImage()
+        return self.frame_at(self.current_frame)
     
-    def get_frame(self) -> QPixmap:
-        if not self.frames:
-            return QPixmap()
-        return self.frames[self.current_frame]
+    def frame_at(self, index: int):
+        if self.loader is None:
+            return QImage()
+        return self.loader(self, index)
+    
+    def indices_from(self, start: int, count: int) -> list:
+        # start 之后的若干帧索引，循环动画会绕回开头
+        total = len(self.files)
+        indices = []
+        for offset in range(min(count, total)):
+            index = start + offset
+            if index >= total:
+                if not self.loop:
+                    break
+                index %= total
+            indices.append(index)
+        return indices
     
     def next_frame(self) -> bool:
-        self.current_frame += 1
-        if self.current_frame >= len(self.frames):
+        return self.advance(1)
+    
+    def advance(self, steps: int) -> bool:
+        # 前进若干帧（落后时跳帧），非循环动画越过最后一帧时返回 False
+        self.current_frame += steps
+        if self.current_frame >= len(self.files):
             if self.loop:
-                self.current_frame = 0
+                self.current_frame %= len(self.files)
             else:
-                self.current_frame = len(self.frames) - 1
+                self.current_frame = len(self.files) - 1
                 return False
         return True
     
@@ -29,49 +70,342 @@ class Animation:
         self.current_frame = 0
 
 class AnimationManager(QObject):
-    frame_changed = pyqtSignal(QPixmap)
+    frame_changed = pyqtSignal(QImage, QRect)  # 当前帧及其相对上一帧变化的区域，空矩形表示整帧
     animation_finished = pyqtSignal(str)
+    fps_changed = pyqtSignal(float)  # 实际播放帧率变化（暂停时为 0）
+    hit_mask_ready = pyqtSignal()  # 当前帧的点击判定位图在后台生成好了
+    
+    EXTENSIONS = [".png", ".jpg", ".jpeg", ".gif"]
+    DEFAULT_FPS = 24
+    ONE_SHOT_ACTIONS = ["click", "拖动", "气鼓鼓"]  # 默认不循环的动作
+    TICK_SAMPLES = 240  # 保留最近多少次帧时钟回调的耗时，用于统计 p50/p99
+    LOOKAHEAD = 6  # 在当前帧之前预先解码的帧数
+    PREFETCH_FRAMES = 6  # 预取下一个可能动作时解码的帧数
+    DEFAULT_CACHE_BYTES = 128 * 1024 * 1024
+    DEFAULT_SOURCE_CACHE_BYTES = 32 * 1024 * 1024
+    DEFAULT_HIT_MASK_BYTES = 8 * 1024 * 1024
+    DEFAULT_WARM_CACHE_BYTES = 32 * 1024 * 1024
     
-    def __init__(self, animations_dir: Path, width: int = 500, height: int = 600):
+    def __init__(self, animations_dir: Path, width: int = 500, height: int = 600,
+                 cache: FrameCache = None, loader: FrameLoader = None,
+                 source_cache: FrameCache = None, first_action: str = None,
+                 hit_masks: HitMaskCache = None, warm_cache: FrameCache = None,
+                 in_use: dict = None):
         super().__init__()
         self.animations_dir = animations_dir
+        self.character = animations_dir.parent.name
         self.width = width
         self.height = height
         self.animations = {}
         self.current_animation = None
+        # 帧缓存可以在多个管理器之间共享，键中包含角色名和尺寸
+        self.cache = cache if cache is not None else FrameCache(self.DEFAULT_CACHE_BYTES)
+        # 最近解码过的原始分辨率源图，切换比例时直接从它们缩放，不必重新解码 PNG
+        self.source_cache = source_cache if source_cache is not None \
+            else FrameCache(self.DEFAULT_SOURCE_CACHE_BYTES)
+        self._source_frame_bytes = 0  # 一张源图解码后的字节数，解码出第一张后才知道
+        # 各帧的点击判定位图，和帧缓存一样按角色和尺寸区分
+        self.hit_masks = hit_masks if hit_masks is not None \
+            else HitMaskCache(self.DEFAULT_HIT_MASK_BYTES)
+        # 分层存放帧：正在播放的动作在热层（self.cache，解码好的 QImage），
+        # 最近播放过的动作压缩后放在温层，其余动作留在磁盘（冷层）。
+        # 切换动作时旧动作降级到温层，播放温层中的动作时在后台解压回热层。
+        self.warm_cache = warm_cache if warm_cache is not None \
+            else FrameCache(self.DEFAULT_WARM_CACHE_BYTES, cost=lambda packed: packed.cost)
+        # 共用帧缓存的管理器正在播放或预取的动作：(角色, 动作, 宽, 高) -> 引用数，
+        # 只有谁都不再使用的动作才从热层降级
+        self.in_use = in_use if in_use is not None else {}
+        self._held = set()  # 本管理器计入 in_use 的动作
+        self.promotions = 0  # 从温层解压回热层的帧数
+        self.demotions = 0  # 从热层降级到温层的帧数
+        self.cold_loads = 0  # 从磁盘解码的帧数
+        # 图片解码和缩放都在后台线程完成，GUI 线程从不等待解码
+        # 帧统一以 QImage 传递，磁盘缓存中的帧可以零拷贝地直接使用
+        self._owns_loader = loader is None  # 共享的解码线程由创建者负责关闭
+        self.loader = loader if loader is not None else FrameLoader()
+        self.loader.frame_ready.connect(self._on_frame_ready)
+        self.loader.result_ready.connect(self._on_result)
+        self._shown_key = None  # 当前已显示在屏幕上的帧
+        self._prefetched = set()  # 预取过的动作，切换时不取消它们的解码任务
+        self._next_random = None  # play_random 的下一个候选动作
+        self.store = None  # 当前尺寸的预缩放磁盘缓存（如果已构建且未过期），帧不进入 LRU 缓存
+        # 正在显示的帧由管理器持有，界面在绘制时直接引用它，避免差分画布被复制
+        # 帧只保存非透明像素的外接矩形，current_rect 为它在整帧坐标中的位置，界面按这个位置绘制
+        self.current_image = None
+        self.current_rect = QRect()
+        self._blank = QImage(1, 1, STORE_FORMAT)  # 裁剪缓存中全透明的帧
+        self._blank.fill(0)
+        self._canvas = None  # 差分缓存播放时叠加补丁的画布
+        self._canvas_pos = None  # 画布当前对应的 (动作名, 帧索引)
+        self._canvas_content = QRect()  # 画布上可能有非透明像素的区域，关键帧只需清除这里
         
-        self.timer = QTimer()
+        # 帧时钟：按单调时钟计算应显示的帧，每次只把单次定时器对准下一帧的时刻，
+        # 定时器抖动和事件循环卡顿不会累积成漂移，落后时直接跳到应显示的帧；
+        # 定时器由全局调度器统一唤醒，多只桌宠共用同一个时钟
+        self.timer = scheduler.timer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self._update_frame)
-        self.fps = 24  # 加快动画速度
+        self.fps = self.DEFAULT_FPS  # 默认帧率，动作目录下的 meta.json 可以单独指定
+        self.skipped_frames = 0  # 因为落后而跳过的帧数
+        self._clock_start = 0.0  # 当前帧开始显示的单调时间
+        self._clock_steps = 0  # 从 _clock_start 起已经前进的帧数
+        self._running = False  # 当前动作是否在播放（非循环动作播完后为 False）
+        self._paused = False  # 隐藏、最小化或被遮挡时暂停帧时钟
+        self._fps_limits = {}  # 各来源（空闲节流等）对帧率的上限
+        self._ticks_saved = 0.0  # 暂停和降帧率省下的定时器唤醒次数
+        self._saving_since = time.perf_counter()
+        self.busy_time = 0.0  # 帧时钟回调累计耗时（秒），供帧率调节使用
+        self.ticks = 0
+        self.tick_times = deque(maxlen=self.TICK_SAMPLES)  # 最近的帧时钟回调耗时（秒）
+        self._reported_fps = 0.0
         
-        self._load_animations()
+        # 指定 first_action 时先只登记这一个动作，尽快显示第一帧，其余动作由 index_remaining 补齐
+        self._indexed_all = False
+        if not first_action or not self._index_action(animations_dir / first_action):
+            self.index_remaining()
+        else:
+            self._open_store()
+    
+    def index_remaining(self):
+        if self._indexed_all:
+            return
+        self._indexed_all = True
+        self._index_animations()
+        self._open_store()
     
-    def _load_animations(self):
+    def _index_animations(self):
+        # 只登记每个动作的文件列表，帧在首次播放时再解码
         if not self.animations_dir.exists():
             return
         
+        # 按目录顺序重建，已经登记过的动作保留原对象（可能正在播放）
+        existing = self.animations
+        self.animations = {}
         for anim_dir in self.animations_dir.iterdir():
-            if anim_dir.is_dir():
-                frames = self._load_frames(anim_dir)
-                if frames:
-                    # 默认除了点击和拖动外都循环
-                    loop = anim_dir.name not in ["click", "拖动", "气鼓鼓"]
-                    self.animations[anim_dir.name] = Animation(anim_dir.name, frames, loop)
-    
-    def _load_frames(self, directory: Path) -> list:
-        frames = []
-        extensions = [".png", ".jpg", ".jpeg", ".gif"]
-        
-        files = sorted([f for f in directory.iterdir() 
-                       if f.suffix.lower() in extensions])
-        
-        for file in files:
-            pixmap = QPixmap(str(file))
-            if not pixmap.isNull():
-                scaled = pixmap.scaled(self.width, self.height)
-                frames.append(scaled)
-        
-        return frames
+            if anim_dir.name in existing:
+                self.animations[anim_dir.name] = existing[anim_dir.name]
+            else:
+                self._index_action(anim_dir)
+    
+    def _index_action(self, anim_dir: Path) -> bool:
+        if not anim_dir.is_dir():
+            return False
+        files = self._list_frames(anim_dir)
+        if not files:
+            return False
+        meta = self.read_meta(anim_dir)
+        # 默认除了点击和拖动外都循环
+        loop = meta.get("loop", anim_dir.name not in self.ONE_SHOT_ACTIONS)
+        self.animations[anim_dir.name] = Animation(
+            anim_dir.name, files, loop, loader=self._get_frame, fps=meta.get("fps")
+        )
+        return True
+    
+    @staticmethod
+    def read_meta(directory: Path) -> dict:
+        # 可选的动作元数据，例如 {"fps": 12, "loop": false}
+        meta_file = directory / "meta.json"
+        if not meta_file.exists():
+            return {}
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception as e:
+            print(f"读取动作元数据失败 {meta_file}: {e}")
+            return {}
+        if not isinstance(meta, dict):
+            return {}
+        fps = meta.get("fps")
+        if not isinstance(fps, (int, float)) or fps <= 0:
+            meta.pop("fps", None)
+        return meta
+    
+    def _list_frames(self, directory: Path) -> list:
+        return sorted([f for f in directory.iterdir() 
+                       if f.suffix.lower() in self.EXTENSIONS])
+    
+    def _open_store(self):
+        # 有对应尺寸的预缩放缓存时直接读取，否则退回到 PNG 解码
+        files = {name: anim.files for name, anim in self.animations.items()}
+        self.store = FrameStore.open(self.animations_dir, files, self.width, self.height,
+                                     partial=not self._indexed_all)
+        # 点击判定位图的缓存至少要放得下最长的一个动作（按整帧估算）
+        longest = max((anim.frame_count for anim in self.animations.values()), default=0)
+        self.hit_masks.reserve(self, longest * ((self.width + 7) // 8) * self.height)
+    
+    def _frame_key(self, anim: Animation, index: int) -> tuple:
+        return (self.character, anim.name, index, self.width, self.height)
+    
+    def _source_key(self, anim: Animation, index: int) -> tuple:
+        return (self.character, anim.name, index, 0, 0)
+    
+    def _owns_job(self, key) -> bool:
+        # 可以撤回的解码任务：本角色的帧和点击判定位图（压缩任务不撤回）
+        return key[0] == self.character and (len(key) == 5 or key[-1] == "mask")
+    
+    def _uses_canvas(self, anim: Animation) -> bool:
+        # 差分缓存中的帧是相对上一帧的补丁，需要叠加到画布上；裁剪缓存的关键帧直接按位置绘制
+        store = self.store
+        return store is not None and store.delta and store.has_frame(anim.name, 0)
+    
+    def _get_frame(self, anim: Animation, index: int):
+        # 映射的帧由系统页缓存管理，不占用 LRU 缓存预算
+        if self._uses_canvas(anim):
+            self._compose(anim, index)
+            return self._canvas
+        if self.store is not None and self.store.has_frame(anim.name, index):
+            image = self.store.frame_image(anim.name, index)
+            return image if not image.isNull() else self._blank
+        key = self._frame_key(anim, index)
+        image = self.cache.get(key)
+        if image is None:
+            self._request(anim, index, PRIORITY_CURRENT)
+        return image
+    
+    def _request(self, anim: Animation, index: int, priority: int):
+        key = self._frame_key(anim, index)
+        if self.store is not None and self.store.has_frame(anim.name, index):
+            # 磁盘缓存中的帧不用解码，只需提前生成点击判定位图
+            self._request_store_mask(key, priority)
+            return
+        if self.cache.contains(key):
+            return
+        width, height = self.width, self.height
+        mask_key = key + ("mask",) if not self.hit_masks.contains(key) else None
+        queued = self.loader.is_pending(key)
+        packed = self.warm_cache.get(key)
+        source_key = self._source_key(anim, index)
+        source = self.source_cache.get(source_key) if packed is None else None
+        if packed is not None:
+            # 温层中有压缩的帧：解压比解码 PNG 再缩放快一个数量级
+            if not queued:
+                self.promotions += 1
+            decode = lambda: with_mask({key: packed.unpack()}, key, mask_key)
+        elif source is not None:
+            decode = lambda: with_mask(
+                {key: with_digest(trim_frame(scale_frame(source, width, height)))}, key, mask_key)
+        else:
+            if not queued:
+                self.cold_loads += 1
+            path = anim.files[index]
+            def decode():
+                image = decode_source(path)
+                frame = with_digest(trim_frame(scale_frame(image, width, height)))
+                return with_mask({source_key: image, key: frame}, key, mask_key)
+        self.loader.request(key, decode, priority, owner=self)
+    
+    def _request_mask(self, key: tuple, source, priority: int):
+        # 在解码线程中生成点击判定位图；source 在工作线程中调用，返回 (只读的帧, 帧在整帧中的位置)
+        if self.hit_masks.contains(key):
+            return
+        mask_key = key + ("mask",)
+        def build():
+            image, origin = source()
+            return {mask_key: HitMask.from_image(image, origin=origin)}
+        self.loader.request(mask_key, build, priority, owner=self)
+    
+    def _request_store_mask(self, key: tuple, priority: int):
+        # 差分缓存的帧在工作线程中从关键帧重新叠加，不需要复制播放用的画布
+        store, name, index = self.store, key[1], key[2]
+        self._request_mask(key, lambda: store.compose(name, index), priority)
+    
+    def _request_frames(self, anim: Animation, start: int, count: int, priority: int):
+        for index in anim.indices_from(start, count):
+            self._request(anim, index, priority)
+    
+    def _on_frame_ready(self, key, image: QImage):
+        if key[0] != self.character or len(key) != 5:
+            return
+        if key[3:] == (0, 0):
+            if not self._source_frame_bytes and not image.isNull():
+                self._source_frame_bytes = FrameCache.frame_cost(image)
+                self._reserve_sources()
+            self.source_cache.put(key, image)
+            return
+        # 像素相同的帧（定格姿势、动作间共用的起止姿势）只保留一份
+        self.cache.put(key, image, image.text("digest") or None)
+        # 当前帧解码完成后立即显示
+        anim = self.current_animation
+        if anim and key == self._frame_key(anim, anim.current_frame) and key != self._shown_key:
+            self._emit_current_frame()
+            # 等待解码的时间不计入播放进度，从显示出来的这一刻重新计时
+            if self.timer.isActive():
+                self._start_clock()
+    
+    def _hold_actions(self):
+        # 按当前动作、预取的动作和当前尺寸更新本管理器在 in_use 中的引用
+        held = {(self.character, name, self.width, self.height) for name in self._prefetched}
+        if self.current_animation is not None:
+            held.add((self.character, self.current_animation.name, self.width, self.height))
+        self._set_held(held)
+    
+    def _set_held(self, held: set):
+        for action in self._held - held:
+            self.in_use[action] -= 1
+            if not self.in_use[action]:
+                del self.in_use[action]
+        for action in held - self._held:
+            self.in_use[action] = self.in_use.get(action, 0) + 1
+        self._held = held
+    
+    def _action_in_use(self, key: tuple) -> bool:
+        return (key[0], key[1], key[3], key[4]) in self.in_use
+    
+    def _demote(self, anim: Animation):
+        # 不再播放的动作：热层中的帧在后台压缩进温层，之后再从热层移除
+        # 共用帧缓存的其它桌宠还在播放或预取的同一动作、同一尺寸的帧留在热层
+        if self.warm_cache.budget_bytes <= 0:
+            return
+        if self._action_in_use(self._frame_key(anim, 0)):
+            return
+        for index in range(anim.frame_count):
+            key = self._frame_key(anim, index)
+            image = self.cache.peek(key)
+            if image is None:
+                continue
+            if self.warm_cache.contains(key):
+                self.cache.remove(key)
+                self.demotions += 1
+            else:
+                packed_key = key + ("packed",)
+                self.loader.request(packed_key, lambda k=packed_key, i=image: {k: PackedFrame(i)},
+                                    PRIORITY_PREFETCH, owner=self)
+    
+    def _on_result(self, result_key, result):
+        if result_key[0] != self.character:
+            return
+        if result_key[-1] == "mask":
+            key = result_key[:5]
+            self.hit_masks.put(key, result)
+            if key == self._shown_key:
+                self.hit_mask_ready.emit()
+        elif result_key[-1] == "packed":
+            self._on_packed(result_key, result)
+    
+    def _on_packed(self, packed_key, packed):
+        key = packed_key[:5]
+        if not self.warm_cache.contains(key):
+            self.warm_cache.put(key, packed, packed.digest or None)
+        # 压缩期间又被某只桌宠播放（或预取）的动作保留在热层
+        if not self._action_in_use(key) and self.cache.contains(key):
+            self.cache.remove(key)
+            self.demotions += 1
+    
+    def _reserve_sources(self):
+        # 源图缓存至少放得下当前动作的全部源图，切换比例时整个动作都不必重新解码 PNG
+        anim = self.current_animation
+        if anim is not None and self._source_frame_bytes:
+            self.source_cache.reserve(self, anim.frame_count * self._source_frame_bytes)
+    
+    def prefetch(self, name: str, start_frame: int = 0, count: int = None):
+        # 提前在后台解码某个动作的若干帧，切换过去时无需等待
+        anim = self.animations.get(name)
+        if anim is None:
+            return
+        self._prefetched.add(name)
+        self._hold_actions()
+        self._request_frames(anim, start_frame, count or self.PREFETCH_FRAMES, PRIORITY_PREFETCH)
     
     def play(self, name: str, loop_override: bool = None, start_frame: int = 0):
         if name not in self.animations:
@@ -81,65 +415,383 @@ class AnimationManager(QObject):
                 name = list(self.animations.keys())[0]
             else:
                 return
-            
+        
+        previous = self.current_animation
         self.current_animation = self.animations[name]
+        self._prefetched.discard(name)
+        self._hold_actions()
+        self._reserve_sources()
+        if previous is not None and previous.name != name:
+            self._demote(previous)
+        # 撤回本管理器对其它动作尚未开始的解码请求（预取的动作和压缩任务除外），
+        # 共用解码线程的其它桌宠仍需要的帧不受影响
+        keep = self._prefetched | {name}
+        self.loader.cancel(lambda key: self._owns_job(key) and key[1] not in keep, owner=self)
+        
         if start_frame == 0:
             self.current_animation.reset()
         else:
             # 确保帧索引有效
-            max_idx = max(0, len(self.current_animation.frames) - 1)
+            max_idx = max(0, self.current_animation.frame_count - 1)
             self.current_animation.current_frame = max(0, min(start_frame, max_idx))
                 
         if loop_override is not None:
             self.current_animation.loop = loop_override
-            
-        self.frame_changed.emit(self.current_animation.get_frame())
+        
+        self._account_ticks()
+        self._running = True
+        self._shown_key = None
+        self._emit_current_frame()
+        if not self._paused:
+            self._start_clock()
+        self._report_fps()
+    
+    def frame_fps(self, anim: Animation, limited: bool = True) -> float:
+        fps = anim.fps or self.fps
+        if limited and self._fps_limits:
+            fps = min(fps, min(self._fps_limits.values()))
+        return fps
+    
+    def set_fps_limit(self, source: str, fps: float = None):
+        # 限制帧率上限，fps 为 None 时解除该来源的限制
+        self._account_ticks()
+        if fps:
+            self._fps_limits[source] = fps
+        else:
+            self._fps_limits.pop(source, None)
+        if self.timer.isActive():
+            self._start_clock()
+        self._report_fps()
+    
+    @property
+    def effective_fps(self) -> float:
+        if self._paused or not self._running or self.current_animation is None:
+            return 0.0
+        return float(self.frame_fps(self.current_animation))
+    
+    def _report_fps(self):
+        fps = self.effective_fps
+        if fps != self._reported_fps:
+            self._reported_fps = fps
+            self.fps_changed.emit(fps)
+    
+    def pause(self):
+        # 停止帧时钟但保留当前帧，恢复时从同一帧继续
+        if self._paused:
+            return
+        self._account_ticks()
+        self._paused = True
+        self.timer.stop()
+        self._report_fps()
+    
+    def resume(self):
+        if not self._paused:
+            return
+        self._account_ticks()
+        self._paused = False
+        if self._running and self.current_animation is not None:
+            self._start_clock()
+        self._report_fps()
+    
+    @property
+    def paused(self) -> bool:
+        return self._paused
+    
+    @property
+    def ticks_saved(self) -> int:
+        self._account_ticks()
+        return int(self._ticks_saved)
     
-        self.timer.start(1000 // self.fps)
+    def _account_ticks(self):
+        # 累计与默认帧率相比少触发的定时器次数
+        now = time.perf_counter()
+        anim = self.current_animation
+        if self._running and anim is not None:
+            full = self.frame_fps(anim, limited=False)
+            actual = 0 if self._paused else self.frame_fps(anim)
+            self._ticks_saved += (now - self._saving_since) * (full - actual)
+        self._saving_since = now
+    
+    def _start_clock(self):
+        self._clock_start = time.perf_counter()
+        self._clock_steps = 0
+        self._schedule_tick()
+    
+    def _schedule_tick(self):
+        # 定时器对准下一帧应当出现的时刻，而不是固定间隔
+        fps = self.frame_fps(self.current_animation)
+        due = self._clock_start + (self._clock_steps + 1) / fps
+        delay = math.ceil((due - time.perf_counter()) * 1000)
+        self.timer.start(max(0, delay))
     
     def stop(self):
+        self._account_ticks()
+        self._running = False
+        self.timer.stop()
+        self._report_fps()
+    
+    def shutdown(self):
         self.timer.stop()
+        self._set_held(set())
+        if self._owns_loader:
+            self.loader.shutdown()
     
     def _update_frame(self):
+        start = time.perf_counter()
+        self._tick()
+        elapsed = time.perf_counter() - start
+        self.busy_time += elapsed
+        self.ticks += 1
+        self.tick_times.append(elapsed)
+    
+    def _tick(self):
         if not self.current_animation:
             return
         
-        if not self.current_animation.next_frame():
-            self.timer.stop()
-            self.animation_finished.emit(self.current_animation.name)
+        # 当前帧还没解码出来时停在原地，不跳过它；解码完成后会重新计时
+        anim = self.current_animation
+        if self._shown_key != self._frame_key(anim, anim.current_frame):
+            # 任务可能被共享解码线程上的其它桌宠取消，重新请求（已在队列中时不会重复）
+            self._request(anim, anim.current_frame, PRIORITY_CURRENT)
+            self._start_clock()
+            return
+        
+        # 按实际经过的时间计算应前进的帧数，事件循环卡顿后直接跳到应显示的帧
+        due_steps = int((time.perf_counter() - self._clock_start) * self.frame_fps(anim))
+        steps = due_steps - self._clock_steps
+        if steps <= 0:
+            self._schedule_tick()
+            return
+        self._clock_steps = due_steps
+        self.skipped_frames += steps - 1
+        
+        if not anim.advance(steps):
+            self._account_ticks()
+            self._running = False
+            self._report_fps()
+            self.animation_finished.emit(anim.name)
             return
         
-        self.frame_changed.emit(self.current_animation.get_frame())
+        self._emit_current_frame()
+        self._schedule_tick()
     
-    def get_current_frame(self) -> QPixmap:
-        if self.current_animation:
-            return self.current_animation.get_frame()
-        return QPixmap()
+    def _emit_current_frame(self):
+        anim = self.current_animation
+        if self._uses_canvas(anim):
+            # 差分播放：只把新帧的补丁叠加到画布上，并报告变化区域
+            from_canvas = self.current_image is self._canvas
+            dirty = self._compose(anim, anim.current_frame)
+            image = self._canvas
+            rect = image.rect()
+            if not from_canvas:
+                dirty = QRect()
+        else:
+            image = anim.get_frame()
+            rect = QRect()
+            dirty = QRect()
+            if image is not None and not image.isNull():
+                rect = self._placement(anim, anim.current_frame, image)
+                if self.current_image is not None:
+                    # 只需重绘上一帧和这一帧内容区域的并集，透明边缘不动
+                    dirty = self.current_rect.united(rect)
+        
+        if image is not None:
+            self._shown_key = self._frame_key(anim, anim.current_frame)
+            # 损坏的帧不替换画面，保留上一帧
+            if not image.isNull():
+                self.current_image = image
+                self.current_rect = rect
+                self.frame_changed.emit(image, dirty)
+        self._request_frames(anim, anim.current_frame + 1, self.LOOKAHEAD, PRIORITY_LOOKAHEAD)
+    
+    def _placement(self, anim: Animation, index: int, image: QImage) -> QRect:
+        # 帧在整帧坐标中的位置：磁盘缓存的帧记在索引里，解码出的帧记在 QImage.offset() 中
+        # （映射内存上的 QImage 是只读的，设置 offset 会触发复制）
+        if self.store is not None and self.store.has_frame(anim.name, index):
+            rect = self.store.frame_rect(anim.name, index)
+            return rect if not rect.isEmpty() else self._blank.rect()
+        return frame_rect(image)
+    
+    def _compose(self, anim: Animation, index: int) -> QRect:
+        # 把画布推进到指定帧，返回画布上被改写的区域
+        store = self.store
+        name = anim.name
+        canvas = self._canvas
+        if canvas is None or canvas.width() != store.width or canvas.height() != store.height:
+            canvas = self._canvas = QImage(store.width, store.height, STORE_FORMAT)
+            self._canvas_pos = None
+            self._canvas_content = canvas.rect()  # 新画布的内容未初始化
+        
+        keyframe = store.keyframe_before(name, index)
+        pos = self._canvas_pos
+        if pos is not None and pos[0] == name and keyframe <= pos[1] <= index:
+            # 顺序播放（含跳帧）：从画布当前帧之后开始叠加
+            start = pos[1] + 1
+        else:
+            start = keyframe
+        
+        dirty = QRect()
+        if start <= index:
+            painter = QPainter(canvas)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            for i in range(start, index + 1):
+                rect = store.frame_rect(name, i)
+                if store.is_keyframe(name, i):
+                    # 关键帧替换整幅画面：先清掉画布上原有的内容
+                    painter.fillRect(self._canvas_content, Qt.transparent)
+                    dirty = dirty.united(self._canvas_content)
+                    self._canvas_content = QRect()
+                if rect.isEmpty():
+                    continue
+                painter.drawImage(rect.topLeft(), store.frame_image(name, i))
+                dirty = dirty.united(rect)
+                self._canvas_content = self._canvas_content.united(rect)
+            painter.end()
+        self._canvas_pos = (name, index)
+        return dirty
+    
+    def current_hit_mask(self):
+        # 当前显示的帧的点击判定位图；还没有帧或者位图还在后台生成时返回 None，
+        # 生成好之后发出 hit_mask_ready
+        image = self.current_image
+        key = self._shown_key
+        if image is None or key is None:
+            return None
+        mask = self.hit_masks.get(key)
+        if mask is None and not self.loader.is_pending(key):
+            # 位图还没生成、被淘汰了，或者帧不是经解码线程得到的（例如切换比例时在 GUI 线程缩放的帧）；
+            # 已在队列中的请求会被提到当前帧的优先级
+            store = self.store
+            if store is not None and key[3:5] == (store.width, store.height) \
+                    and store.has_frame(key[1], key[2]):
+                self._request_store_mask(key, PRIORITY_CURRENT)
+            else:
+                origin = self.current_rect.topLeft()
+                self._request_mask(key, lambda: (image, origin), PRIORITY_CURRENT)
+        return mask
+    
+    def current_content_rect(self) -> QRect:
+        # 当前帧的非透明像素可能出现的区域（整帧坐标），差分播放时是画布上有内容的部分
+        if self.current_image is not None and self.current_image is self._canvas:
+            return self._canvas_content.intersected(self._canvas.rect())
+        return QRect(self.current_rect)
+    
+    def get_current_frame(self) -> QImage:
+        if self.current_image is not None:
+            return self.current_image
+        return QImage()
     
     def has_animation(self, name: str) -> bool:
         return name in self.animations
     
     def get_animation_names(self) -> list:
         return list(self.animations.keys())
+    
+    @property
+    def cache_hits(self) -> int:
+        return self.cache.hits
+    
+    @property
+    def cache_misses(self) -> int:
+        return self.cache.misses
+    
+    @property
+    def cache_evictions(self) -> int:
+        return self.cache.evictions
+    
+    @property
+    def deduplicated_frames(self) -> int:
+        # 运行时缓存中被去重的帧数，加上磁盘缓存构建时合并的帧数
+        store_dedup = self.store.deduplicated if self.store is not None else 0
+        return self.cache.deduplicated + store_dedup
+    
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
+    
+    def metrics(self) -> dict:
+        samples = list(self.tick_times)
+        anim = self.current_animation
+        return {
+            "action": anim.name if anim is not None else None,
+            "fps": self.effective_fps,
+            "paused": self._paused,
+            "ticks": self.ticks,
+            "tick_p50_us": round(percentile(samples, 0.5) * 1e6, 1),
+            "tick_p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+            "skipped_frames": self.skipped_frames,
+            "ticks_saved": self.ticks_saved,
+            "store": self.store is not None,
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+            "cold_loads": self.cold_loads,
+        }
+    
+    def tier_stats(self) -> dict:
+        return {
+            "hot": self.cache.stats(),
+            "warm": self.warm_cache.stats(),
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+            "cold_loads": self.cold_loads,
+        }
 
     def update_size(self, width: int, height: int):
+        anim = self.current_animation
+        old_frame = self.get_current_frame() if anim else QImage()
+        old_rect, old_size = self.current_rect, (self.width, self.height)
         self.width = width
         self.height = height
-        # 重新加载所有动画以应用新尺寸
-        self.animations.clear()
-        self._load_animations()
+        self._open_store()
+        # 缓存键包含尺寸，旧尺寸的帧由 LRU 自然淘汰；其它动作在播放时再按新尺寸生成
         
         # 如果当前有正在播放的动画，尝试恢复
-        if self.current_animation:
-            name = self.current_animation.name
-            frame = self.current_animation.current_frame
-            loop = self.current_animation.loop
-            self.play(name, loop_override=loop, start_frame=frame)
+        if anim:
+            # 当前帧在 GUI 线程立即缩放，比例切换即时生效
+            self._rescale_now(anim, anim.current_frame, old_frame, old_rect, old_size)
+            # 撤回旧尺寸尚未开始的解码请求，否则它们会排在新尺寸的帧之前
+            size = (width, height)
+            self.loader.cancel(lambda key: self._owns_job(key) and key[3:5] != size, owner=self)
+            # 紧接着要显示的几帧优先缩放，动作的其余帧在后台慢慢补齐
+            self._request_frames(anim, anim.current_frame, self.LOOKAHEAD, PRIORITY_CURRENT)
+            rest = anim.indices_from(anim.current_frame, anim.frame_count)[self.LOOKAHEAD:]
+            for index in rest:
+                self._request(anim, index, PRIORITY_PREFETCH)
+            self.play(anim.name, loop_override=anim.loop, start_frame=anim.current_frame)
+    
+    def _rescale_now(self, anim: Animation, index: int, fallback: QImage,
+                     fallback_rect: QRect, old_size: tuple):
+        if self.store is not None and self.store.has_frame(anim.name, index):
+            return
+        key = self._frame_key(anim, index)
+        if self.cache.contains(key):
+            return
+        # 优先使用原始分辨率源图，没有时临时放大/缩小旧尺寸的帧，新帧解码后会替换
+        source = self.source_cache.get(self._source_key(anim, index))
+        if source is not None:
+            self.cache.put(key, trim_frame(scale_frame(source, self.width, self.height)))
+        elif not fallback.isNull():
+            # 旧帧和它的位置按比例缩放；它不对应任何缓存的帧，不生成点击判定位图
+            sx, sy = self.width / old_size[0], self.height / old_size[1]
+            rect = QRect(round(fallback_rect.x() * sx), round(fallback_rect.y() * sy),
+                         max(1, round(fallback_rect.width() * sx)),
+                         max(1, round(fallback_rect.height() * sy)))
+            self.current_image = fallback.scaled(rect.width(), rect.height())
+            self.current_rect = rect
+            self._shown_key = None
+            self.frame_changed.emit(self.current_image, QRect())
 
-    def play_random(self, loop_override: bool = None):
+    def _random_candidates(self) -> list:
         names = self.get_animation_names()
-        if names:
-            normal_anims = [n for n in names if n not in ["拖动", "气鼓鼓"]]
-            if not normal_anims:
-                normal_anims = names
-            self.play(random.choice(normal_anims), loop_override=loop_override)
+        normal_anims = [n for n in names if n not in ["拖动", "气鼓鼓"]]
+        return normal_anims or names
+
+    def play_random(self, loop_override: bool = None):
+        candidates = self._random_candidates()
+        if candidates:
+            # 使用上次预先选好（并已预取）的候选动作，再为下一次挑选并预取
+            name = self._next_random if self._next_random in candidates else random.choice(candidates)
+            if self._next_random is not None:
+                self._prefetched.discard(self._next_random)
+            self._next_random = random.choice(candidates)
+            self.play(name, loop_override=loop_override)
+            self.prefetch(self._next_random)
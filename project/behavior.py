@@ -1,8 +1,10 @@
 from enum import Enum, auto
-from PyQt5.QtCore import QTimer, QObject, pyqtSignal
+from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtWidgets import QDesktopWidget
 import random
 
+from scheduler import scheduler
+
 class PetState(Enum):
     IDLE = auto()
     WALKING_LEFT = auto()
@@ -27,22 +29,28 @@ class BehaviorManager(QObject):
         self.walk_speed = 2
         self.walk_direction = 0
         
+        # 计数器，供性能指标使用
+        self.walk_steps = 0
+        self.state_changes = 0
+        self.dialogs_requested = 0
+        
         desktop = QDesktopWidget()
         screen = desktop.screenGeometry()
         self.screen_width = screen.width()
         self.screen_height = screen.height()
         
-        self.walk_timer = QTimer()
+        self.walk_timer = scheduler.timer()
         self.walk_timer.timeout.connect(self._walk_step)
         
-        self.behavior_timer = QTimer()
+        self.behavior_timer = scheduler.timer()
         self.behavior_timer.timeout.connect(self._random_behavior)
         # 移除自动开启行为定时器，不再自动行走
         # self.behavior_timer.start(random.randint(15000, 30000))
         
-        self.dialog_timer = QTimer()
+        self.dialog_timer = scheduler.timer()
         self.dialog_timer.timeout.connect(self._trigger_dialog)
         self.dialog_timer.start(random.randint(20000, 45000))
+        self._paused_timers = None  # 暂停时各定时器的剩余时间
     
     def set_position(self, x: int, y: int):
         self.x = x
@@ -53,9 +61,30 @@ class BehaviorManager(QObject):
         if not enabled:
             self.stop_walking()
     
+    def pause(self):
+        # 桌宠不可见时暂停定时器，记住剩余时间，恢复后接着计时
+        if self._paused_timers is not None:
+            return
+        self._paused_timers = {}
+        for timer in (self.walk_timer, self.dialog_timer):
+            if timer.isActive():
+                self._paused_timers[timer] = max(0, timer.remainingTime())
+                timer.stop()
+    
+    def resume(self):
+        if self._paused_timers is None:
+            return
+        for timer, remaining in self._paused_timers.items():
+            if timer is self.walk_timer:
+                timer.start(50)
+            else:
+                timer.start(remaining)
+        self._paused_timers = None
+    
     def _change_state(self, new_state: PetState):
         if self.state != new_state:
             self.state = new_state
+            self.state_changes += 1
             self.state_changed.emit(new_state)
     
     def start_idle(self):
@@ -78,12 +107,13 @@ class BehaviorManager(QObject):
         
         self.walk_timer.start(50)
         
-        QTimer.singleShot(random.randint(3000, 8000), self.start_idle)
+        scheduler.single_shot(random.randint(3000, 8000), self.start_idle)
     
     def stop_walking(self):
         self.walk_timer.stop()
     
     def _walk_step(self):
+        self.walk_steps += 1
         new_x = self.x + (self.walk_speed * self.walk_direction)
         
         margin = 50
@@ -112,7 +142,7 @@ class BehaviorManager(QObject):
         self.stop_walking()
         self._change_state(PetState.CLICKING)
         
-        QTimer.singleShot(1000, self.start_idle)
+        scheduler.single_shot(1000, self.start_idle)
     
     def _random_behavior(self):
         # 即使定时器意外触发，如果不启用或正在拖动也不执行任何操作
@@ -124,10 +154,20 @@ class BehaviorManager(QObject):
     
     def _trigger_dialog(self):
         if self.enabled and self.state not in [PetState.DRAGGING]:
+            self.dialogs_requested += 1
             self.request_dialog.emit()
         
         self.dialog_timer.start(random.randint(20000, 45000))
     
+    def metrics(self) -> dict:
+        return {
+            "state": self.state.name,
+            "paused": self._paused_timers is not None,
+            "walk_steps": self.walk_steps,
+            "state_changes": self.state_changes,
+            "dialogs_requested": self.dialogs_requested,
+        }
+    
     def get_animation_name(self) -> str:
         mapping = {
             PetState.IDLE: "站立",
@@ -0,0 +1,390 @@
+"""
+动画与渲染热路径基准
+在 offscreen 平台下驱动真实的 Pet 窗口，报告首帧加载时间、峰值内存、每帧时钟回调和
+Pet._on_frame_changed 的耗时分布、切换比例和切换动作的延迟。
+帧来源可以是仿照 generate_placeholder.py 临时生成的合成帧，也可以是流萤的正式素材。
+结果可以保存为 JSON，之后用 --compare 与新一次运行对比，超过阈值的变慢会标记为退化。
+
+用法:
+    python benchmarks/bench_animation.py
+    python benchmarks/bench_animation.py --frames firefly --seconds 5 --output base.json
+    python benchmarks/bench_animation.py --frames firefly --compare base.json
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QTimer, QEventLoop, PYQT_VERSION_STR, QT_VERSION_STR
+
+from config import config
+from process_stats import percentile, peak_rss_bytes
+import frame_store
+from common import synthetic_frames, PaintCounter
+
+SYNTHETIC_ACTIONS = {"站立": 48, "walk_left": 48, "walk_right": 48, "click": 24}
+SOURCE_SIZE = (500, 600)  # 与正式素材相同的源图尺寸
+SCALE_STEPS = [1.0, 0.5, 0.75]  # 切换比例的顺序，最后回到初始比例
+
+def synthetic_animations(root: Path) -> Path:
+    # 按正式素材的尺寸生成合成帧并保存为 PNG，走与正式素材相同的解码路径
+    width, height = SOURCE_SIZE
+    animations_dir = root / "synthetic" / "animations"
+    for action, count in SYNTHETIC_ACTIONS.items():
+        action_dir = animations_dir / action
+        action_dir.mkdir(parents=True, exist_ok=True)
+        shift = {"walk_left": -0.04, "walk_right": 0.04}.get(action, 0.0)
+        for i, frame in enumerate(synthetic_frames(width, height, count, shift)):
+            frame.save(str(action_dir / f"frame{i:03d}.png"))
+    return animations_dir
+
+class BenchSettings:
+    # 与 Config 接口相同，但修改只保存在内存中，基准不会改写用户的 config.json
+    def __init__(self, animations_dir: Path, scale: float):
+        self.animations_dir = animations_dir
+        self.data = {
+            **config.DEFAULT_CONFIG,
+            "scale": scale,
+            "animation_mode": "keep",
+            "auto_walk": False,
+            "sound_enabled": False,
+            "dialog_enabled": False,
+            "idle_after_s": 0,
+            "cpu_budget_pct": 0,  # 不让帧率调节影响测量
+        }
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key: str, value):
+        self.data[key] = value
+
+    def load_dialogs(self) -> list:
+        return []
+
+def wait_until(predicate, timeout: float = 30.0) -> float:
+    # 运行事件循环直到 predicate() 为真，返回等待的秒数；超时返回 -1
+    start = time.perf_counter()
+    if predicate():
+        return 0.0
+    loop = QEventLoop()
+    poll = QTimer()
+    poll.setTimerType(Qt.PreciseTimer)
+    result = {"elapsed": -1.0}
+    def check():
+        if predicate():
+            result["elapsed"] = time.perf_counter() - start
+            loop.quit()
+        elif time.perf_counter() - start > timeout:
+            loop.quit()
+    poll.timeout.connect(check)
+    poll.start(1)
+    loop.exec_()
+    poll.stop()
+    return result["elapsed"]
+
+def spin(seconds: float):
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec_()
+
+def ms(seconds: float) -> float:
+    return round(seconds * 1000, 2) if seconds >= 0 else -1
+
+def distribution(samples: list) -> dict:
+    # 耗时分布（微秒）
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_us": round(statistics.fmean(samples) * 1e6, 1),
+        "p50_us": round(percentile(samples, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+        "max_us": round(max(samples) * 1e6, 1),
+    }
+
+def shown(am, name: str = None, size: tuple = None) -> bool:
+    # 当前显示的帧是否来自指定动作和尺寸
+    key = am._shown_key
+    if key is None:
+        return False
+    return (name is None or key[1] == name) and (size is None or key[3:] == size)
+
+def measure_load(pet_class, settings) -> tuple:
+    start = time.perf_counter()
+    pet = pet_class(settings)
+    constructed = time.perf_counter() - start
+    first = {"at": -1.0}
+    pet.first_frame_shown.connect(lambda: first.update(at=time.perf_counter() - start))
+    pet.show()
+    wait_until(lambda: first["at"] >= 0)
+    # 与 main.py 相同，首帧之后补齐其余动作的索引
+    index_start = time.perf_counter()
+    pet.animation_manager.index_remaining()
+    result = {
+        "construct_ms": ms(constructed),
+        "first_frame_ms": ms(first["at"]),
+        "index_remaining_ms": ms(time.perf_counter() - index_start),
+        "store": pet.animation_manager.store is not None,
+    }
+    return pet, result
+
+def measure_ticks(pet, seconds: float) -> dict:
+    am = pet.animation_manager
+    anim = am.current_animation
+    # 先把当前动作全部解码好，只测量稳定播放时的开销
+    am.prefetch(anim.name, 0, anim.frame_count)
+    wait_until(lambda: all(am.store is not None and am.store.has_frame(anim.name, i)
+                           or am.cache.contains(am._frame_key(anim, i))
+                           for i in range(anim.frame_count)), timeout=120)
+
+    # 用计时的包装替换信号连接，分别记录时钟回调和 Pet._on_frame_changed 的耗时
+    tick_samples, changed_samples = [], []
+    def timed_tick():
+        t = time.perf_counter()
+        am._update_frame()
+        tick_samples.append(time.perf_counter() - t)
+    def timed_changed(image, dirty):
+        t = time.perf_counter()
+        pet._on_frame_changed(image, dirty)
+        changed_samples.append(time.perf_counter() - t)
+    am.timer.timeout.disconnect()
+    am.timer.timeout.connect(timed_tick)
+    am.frame_changed.disconnect(pet._on_frame_changed)
+    am.frame_changed.connect(timed_changed)
+
+    counter = PaintCounter()
+    pet.installEventFilter(counter)
+    paint_start = pet.paint_time
+    skipped_start = am.skipped_frames
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    spin(seconds)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    pet.removeEventFilter(counter)
+
+    am.timer.timeout.disconnect()
+    am.timer.timeout.connect(am._update_frame)
+    am.frame_changed.disconnect(timed_changed)
+    am.frame_changed.connect(pet._on_frame_changed)
+    paints = max(1, counter.paints)
+    return {
+        "action": anim.name,
+        "fps": am.effective_fps,
+        "tick": distribution(tick_samples),
+        "on_frame_changed": distribution(changed_samples),
+        "paint_mean_us": round((pet.paint_time - paint_start) / paints * 1e6, 1),
+        "painted_px_per_frame": counter.pixels // paints,
+        "skipped_frames": am.skipped_frames - skipped_start,
+        "cpu_ms_per_s": round(cpu * 1000 / wall, 2),
+    }
+
+def measure_scale_changes(pet) -> list:
+    results = []
+    am = pet.animation_manager
+    for scale in SCALE_STEPS:
+        size = pet.size_for_scale(scale)
+        start = time.perf_counter()
+        pet._set_scale(scale)
+        blocking = time.perf_counter() - start
+        ready = wait_until(lambda: shown(am, size=size))
+        if ready >= 0:
+            ready += blocking
+        results.append({
+            "scale": scale,
+            "blocking_ms": ms(blocking),  # _set_scale 占用 GUI 线程的时间
+            "ready_ms": ms(ready),  # 直到新尺寸的真实帧显示出来
+            "store": am.store is not None,
+        })
+    return results
+
+def measure_action_switches(pet) -> list:
+    # 依次切换到每个动作（冷），再按同样顺序切换一遍（缓存或温层中已有）
+    am = pet.animation_manager
+    names = sorted(am.get_animation_names())
+    results = []
+    for round_name in ("cold", "warm"):
+        for name in names:
+            start = time.perf_counter()
+            pet._change_to_animation(name)
+            blocking = time.perf_counter() - start
+            latency = wait_until(lambda: shown(am, name) and am._shown_key[2] == 0)
+            if latency >= 0:
+                latency += blocking
+            results.append({"action": name, "pass": round_name,
+                            "blocking_ms": ms(blocking), "latency_ms": ms(latency)})
+            spin(0.2)
+    return results
+
+def summarize_switches(switches: list) -> dict:
+    summary = {}
+    for round_name in ("cold", "warm"):
+        values = [s["latency_ms"] for s in switches if s["pass"] == round_name and s["latency_ms"] >= 0]
+        if values:
+            summary[f"{round_name}_median_ms"] = round(statistics.median(values), 2)
+            summary[f"{round_name}_max_ms"] = round(max(values), 2)
+    return summary
+
+def run(args) -> dict:
+    app = QApplication.instance() or QApplication(sys.argv)
+    if args.no_store:
+        # 忽略预缩放帧缓存，测量逐帧解码 PNG 的路径
+        frame_store.FrameStore.open = classmethod(lambda cls, *a, **k: None)
+    from pet import Pet
+
+    temp_dir = None
+    if args.frames == "synthetic":
+        temp_dir = Path(tempfile.mkdtemp(prefix="bench_animation_"))
+        animations_dir = synthetic_animations(temp_dir)
+    else:
+        animations_dir = config.assets_dir / "characters" / "firefly" / "animations"
+
+    try:
+        settings = BenchSettings(animations_dir, args.scale)
+        pet, load = measure_load(Pet, settings)
+        load["rss_after_load_mb"] = round(peak_rss_bytes() / 1024 / 1024, 1)
+        ticks = measure_ticks(pet, args.seconds)
+        scales = measure_scale_changes(pet)
+        switches = measure_action_switches(pet)
+        am = pet.animation_manager
+        results = {
+            "load": load,
+            "ticks": ticks,
+            "scale_changes": scales,
+            "action_switches": switches,
+            "action_switch_summary": summarize_switches(switches),
+            "frames_decoded": am.loader.decoded_count,
+            "cache_mb": round(am.cache.used_bytes / 1024 / 1024, 1),
+            "peak_rss_mb": round(peak_rss_bytes() / 1024 / 1024, 1),
+        }
+        pet.hide()
+        pet.cleanup()
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "animation",
+        "frames": args.frames,
+        "scale": args.scale,
+        "seconds": args.seconds,
+        "no_store": args.no_store,
+        "platform": sys.platform,
+        "python": sys.version.split()[0],
+        "qt": QT_VERSION_STR,
+        "pyqt": PYQT_VERSION_STR,
+        "results": results,
+    }
+
+def flatten(data, prefix: str = "") -> dict:
+    # 把嵌套的结果展开成 "路径 -> 数值"，列表按动作/比例/轮次命名
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, list):
+        for index, item in enumerate(data):
+            if isinstance(item, dict):
+                label = "/".join(str(item[k]) for k in ("action", "scale", "pass") if k in item)
+            else:
+                label = str(index)
+            flat.update(flatten(item, f"{prefix}{label or index}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix.rstrip(".")] = data
+    return flat
+
+# 参与对比的指标（都是越小越好）及其视为退化的最小绝对变化，绝对值很小的抖动不算退化
+MIN_CHANGE = {
+    "_ms": 2.0,
+    "_us": 50.0,
+    "_mb": 5.0,
+    "cpu_ms_per_s": 2.0,
+    "painted_px_per_frame": 1000,
+    "skipped_frames": 2,
+}
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    # 返回 [(指标, 基线, 当前, 变化比例, 是否退化)]
+    old = flatten(baseline.get("results", {}))
+    new = flatten(current.get("results", {}))
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        suffix = next((s for s in MIN_CHANGE if name.endswith(s)), None)
+        if suffix is None:
+            continue
+        before, after = old[name], new[name]
+        if before < 0 or after < 0:
+            continue
+        change = (after - before) / before if before else (0.0 if after == before else math.inf)
+        regressed = change > threshold and after - before >= MIN_CHANGE[suffix]
+        rows.append((name, before, after, change, regressed))
+    return rows
+
+def print_report(report: dict):
+    r = report["results"]
+    load, ticks = r["load"], r["ticks"]
+    print(f"帧来源: {report['frames']}  比例: {report['scale']}  "
+          f"预缩放缓存: {'是' if load['store'] else '否'}")
+    print(f"  加载: 构造 {load['construct_ms']} ms, 首帧 {load['first_frame_ms']} ms, "
+          f"补齐索引 {load['index_remaining_ms']} ms")
+    tick, changed = ticks["tick"], ticks["on_frame_changed"]
+    print(f"  播放 {ticks['action']} @ {ticks['fps']} 帧/秒: 时钟回调 p50 {tick.get('p50_us')} us / "
+          f"p99 {tick.get('p99_us')} us, _on_frame_changed p50 {changed.get('p50_us')} us / "
+          f"p99 {changed.get('p99_us')} us, 绘制 {ticks['paint_mean_us']} us, "
+          f"重绘 {ticks['painted_px_per_frame']} 像素/帧, CPU {ticks['cpu_ms_per_s']} ms/s")
+    for s in r["scale_changes"]:
+        print(f"  切换比例到 {int(s['scale'] * 100)}%: 阻塞 {s['blocking_ms']} ms, "
+              f"新尺寸帧显示 {s['ready_ms']} ms")
+    summary = r["action_switch_summary"]
+    print(f"  切换动作: 首次中位数 {summary.get('cold_median_ms')} ms (最大 {summary.get('cold_max_ms')} ms), "
+          f"再次中位数 {summary.get('warm_median_ms')} ms (最大 {summary.get('warm_max_ms')} ms)")
+    print(f"  解码 {r['frames_decoded']} 帧, 帧缓存 {r['cache_mb']} MB, 峰值内存 {r['peak_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="测量动画加载、播放、切换比例和切换动作的开销")
+    parser.add_argument("--frames", choices=["synthetic", "firefly"], default="synthetic")
+    parser.add_argument("--scale", type=float, default=0.75)
+    parser.add_argument("--seconds", type=float, default=3.0, help="测量播放开销的时长")
+    parser.add_argument("--no-store", action="store_true", help="忽略预缩放帧缓存")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--output", help="把 JSON 结果写入文件，作为以后对比的基线")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="变慢超过这个百分比视为退化，默认 20")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.threshold / 100)
+        regressions = [row for row in rows if row[4]]
+        print(f"与 {args.compare} 对比（阈值 {args.threshold:.0f}%）:")
+        for name, before, after, change, regressed in rows:
+            mark = "  <-- 退化" if regressed else ""
+            print(f"  {name:<48} {before:>10} -> {after:>10}  {change:+7.1%}{mark}")
+        print(f"{len(regressions)} 项退化" if regressions else "没有退化")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
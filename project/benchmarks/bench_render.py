@@ -0,0 +1,159 @@
+"""
+渲染路径微基准
+在 offscreen 平台下对比旧的 QLabel.setPixmap 渲染路径与 Pet 现在使用的
+paintEvent 局部重绘路径（帧裁掉透明边缘、按位置绘制），报告每秒播放消耗的 CPU 时间、
+每帧实际重绘的像素数和帧占用的内存。
+offscreen 平台没有真实的窗口合成，重绘面积对应的是 Windows 分层窗口每帧需要合成的区域。
+
+用法:
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --frames firefly --scale 1.0 --seconds 10 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel
+from PyQt5.QtCore import Qt, QTimer, QEventLoop
+from PyQt5.QtGui import QImage, QPixmap, QPainter
+
+from frame_loader import decode_frame, trim_frame, frame_rect
+from common import synthetic_frames, PaintCounter
+
+FPS = 24
+
+def firefly_frames(width: int, height: int, count: int = 48) -> list:
+    from config import config
+    files = sorted((config.animations_dir / "站立").glob("*.png"))[:count]
+    return [decode_frame(f, width, height) for f in files]
+
+def image_bytes(image: QImage) -> int:
+    return image.width() * image.height() * image.depth() // 8
+
+class _BaseView(QWidget):
+    def __init__(self, width: int, height: int):
+        super().__init__()
+        self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setFixedSize(width, height)
+
+class LabelView(_BaseView):
+    # 旧路径：预先转换好的 QPixmap 通过 QLabel.setPixmap 显示
+    name = "qlabel_setpixmap"
+    
+    def __init__(self, frames: list):
+        super().__init__(frames[0].width(), frames[0].height())
+        self.pixmaps = [QPixmap.fromImage(f) for f in frames]
+        self.frame_bytes = sum(image_bytes(f) for f in frames)
+        self.label = QLabel(self)
+        self.label.setFixedSize(self.size())
+        self.label.setAlignment(Qt.AlignCenter)
+    
+    def show_frame(self, index: int):
+        self.label.setPixmap(self.pixmaps[index])
+
+class PaintView(_BaseView):
+    # 新路径：与 Pet 相同，帧只保存非透明部分，只使两帧内容区域的并集失效，在 paintEvent 中按位置绘制
+    name = "paint_event"
+    
+    def __init__(self, frames: list):
+        super().__init__(frames[0].width(), frames[0].height())
+        self.frames = [trim_frame(f) for f in frames]
+        self.frame_bytes = sum(image_bytes(f) for f in self.frames)
+        self.current = None
+    
+    def show_frame(self, index: int):
+        image = self.frames[index]
+        if self.current is None:
+            self.update()
+        else:
+            self.update(frame_rect(self.current).united(frame_rect(image)))
+        self.current = image
+    
+    def paintEvent(self, event):
+        if self.current is None:
+            return
+        painter = QPainter(self)
+        painter.drawImage(self.current.offset(), self.current)
+        painter.end()
+
+def run_view(app: QApplication, view, frame_count: int, seconds: float) -> dict:
+    view.show()
+    app.processEvents()
+    counter = PaintCounter()
+    for widget in [view] + view.findChildren(QWidget):
+        widget.installEventFilter(counter)
+    
+    state = {"index": 0, "ticks": 0}
+    def tick():
+        state["index"] = (state["index"] + 1) % frame_count
+        state["ticks"] += 1
+        view.show_frame(state["index"])
+    
+    timer = QTimer()
+    timer.setTimerType(Qt.PreciseTimer)
+    timer.timeout.connect(tick)
+    
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    timer.start(1000 // FPS)
+    loop.exec_()
+    timer.stop()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    view.hide()
+    
+    return {
+        "path": view.name,
+        "ticks": state["ticks"],
+        "wall_s": round(wall, 3),
+        "cpu_ms_per_s": round(cpu * 1000 / wall, 3),
+        "cpu_us_per_frame": round(cpu * 1e6 / max(1, state["ticks"]), 1),
+        "painted_px_per_frame": counter.pixels // max(1, state["ticks"]),
+        "frame_bytes": view.frame_bytes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 QLabel 与 paintEvent 两种渲染路径的 CPU 开销")
+    parser.add_argument("--frames", choices=["synthetic", "firefly"], default="synthetic")
+    parser.add_argument("--scale", type=float, default=0.75)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+    
+    app = QApplication.instance() or QApplication(sys.argv)
+    width, height = int(350 * args.scale), int(420 * args.scale)
+    frames = synthetic_frames(width, height) if args.frames == "synthetic" \
+        else firefly_frames(width, height)
+    
+    results = []
+    for view_class in (LabelView, PaintView):
+        results.append(run_view(app, view_class(frames), len(frames), args.seconds))
+    
+    report = {
+        "benchmark": "render",
+        "frames": args.frames,
+        "size": [width, height],
+        "fps": FPS,
+        "results": results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    
+    print(f"帧来源: {args.frames}  尺寸: {width}x{height}  目标帧率: {FPS}")
+    for r in results:
+        print(f"  {r['path']:<18} {r['ticks']:>5} 帧  CPU {r['cpu_ms_per_s']:>8.2f} ms/s  "
+              f"{r['cpu_us_per_frame']:>8.1f} us/帧  重绘 {r['painted_px_per_frame']:>7} 像素/帧  "
+              f"帧内存 {r['frame_bytes'] / 1024:>8.0f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import math
+from PyQt5.QtCore import Qt, QObject, QEvent, QRect
+from PyQt5.QtGui import QImage, QPainter, QColor, QPen
+
+# 各基准脚本共用的合成帧和绘制统计
+
+def synthetic_frame(width: int, height: int, index: int, shift: float = 0.0) -> QImage:
+    # 与 generate_placeholder.py 相同的上下浮动椭圆（带眼睛和嘴），按给定尺寸绘制，四周留出透明边缘；
+    # shift 为水平偏移占宽度的比例，用来区分向左、向右走的动作
+    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    image.fill(0)
+    dx = round(width * shift)
+    dy = round(math.sin(index * math.pi / 12) * height * 0.02)
+    line = max(1, width // 125)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setPen(QPen(QColor(255, 105, 180), line))
+    painter.setBrush(QColor(255, 182, 193, 220))
+    painter.drawEllipse(QRect(width // 5 + dx, height // 6 + dy, width * 3 // 5, height * 2 // 3))
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(60, 60, 60))
+    eye = width // 20
+    eye_y = height * 23 // 60 + dy
+    painter.drawEllipse(width * 38 // 100 + dx, eye_y, eye, eye)
+    painter.drawEllipse(width * 57 // 100 + dx, eye_y, eye, eye)
+    # 嘴是下半个圆弧，角度以 1/16 度为单位
+    painter.setPen(QPen(QColor(60, 60, 60), line))
+    painter.setBrush(Qt.NoBrush)
+    painter.drawArc(width * 42 // 100 + dx, height * 8 // 15 + dy, width * 4 // 25, height // 15,
+                    180 * 16, 180 * 16)
+    painter.end()
+    return image
+
+def synthetic_frames(width: int, height: int, count: int = 48, shift: float = 0.0) -> list:
+    return [synthetic_frame(width, height, i, shift) for i in range(count)]
+
+class PaintCounter(QObject):
+    # 安装为事件过滤器，统计窗口及其子控件收到的绘制事件次数和覆盖的像素数
+    def __init__(self):
+        super().__init__()
+        self.paints = 0
+        self.pixels = 0
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.paints += 1
+            for rect in event.region().rects():
+                self.pixels += rect.width() * rect.height()
+        return False
@@ -0,0 +1,54 @@
+"""
+预缩放帧缓存构建脚本
+为角色的每个人物比例生成打包好的原始像素数据和索引文件，
+程序启动或切换比例时直接内存映射读取，不再逐帧解码 PNG 并缩放。
+源图片修改后缓存会自动失效，重新运行此脚本即可。
+使用 --delta 时按关键帧加差分矩形编码，相邻帧只保存变化的区域。
+与 compile_character.py 使用同一套检查和编译流程，生成的缓存和 manifest.json 完全相同。
+"""
+import argparse
+import sys
+from PyQt5.QtGui import QGuiApplication
+
+from config import config
+from compile_character import validate, compile_character, print_report
+from frame_store import cache_dir_for, SCALES
+
+def build_character(character: str, scales: list, delta: bool = False):
+    character_dir = config.assets_dir / "characters" / character
+    actions, errors, warnings = validate(character_dir)
+    for warning in warnings:
+        print(f"警告: {warning}")
+    for error in errors:
+        print(f"错误: {error}")
+    if errors:
+        return False
+    
+    manifest = compile_character(character_dir, actions, scales, delta=delta)
+    print_report(manifest)
+    print(f"缓存目录: {cache_dir_for(character_dir / 'animations')}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="构建预缩放的动画帧缓存")
+    parser.add_argument("--character", default=config.get("character", "firefly"),
+                        help="角色目录名，默认使用 config.json 中的角色")
+    parser.add_argument("--scale", type=float, action="append",
+                        help="要构建的人物比例，可重复指定；默认使用 config.json 中的比例")
+    parser.add_argument("--all", action="store_true",
+                        help="构建右键菜单中的全部人物比例（占用磁盘较多）")
+    parser.add_argument("--delta", action="store_true",
+                        help="使用关键帧 + 差分矩形编码，减小缓存体积和每帧绘制面积")
+    args = parser.parse_args()
+    
+    if args.all:
+        scales = SCALES
+    else:
+        scales = args.scale or [config.get("scale", 1.0)]
+    
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv)
+    ok = build_character(args.character, scales, delta=args.delta)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
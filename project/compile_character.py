@@ -0,0 +1,235 @@
+"""
+角色素材编译脚本
+检查角色目录是否完整可用，然后把各动作的序列帧裁掉透明边框、合并重复帧、
+预缩放到各人物比例，打包成运行时直接内存映射读取的帧缓存，
+并生成记录帧数、帧率、是否循环和内容范围的清单 (manifest.json)，最后报告编译前后的体积。
+只检查不编译时使用 --check。
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from PyQt5.QtGui import QGuiApplication, QImage, QImageReader
+from PyQt5.QtCore import QRect
+
+from config import config
+from animation import AnimationManager
+from frame_loader import decode_source, scale_frame, content_rect, frame_digest
+from frame_store import (FrameStore, StoreWriter, cache_dir_for, size_for_scale, SCALES,
+                         BYTES_PER_PIXEL)
+
+MANIFEST_NAME = "manifest.json"
+
+def list_actions(animations_dir) -> dict:
+    actions = {}
+    for anim_dir in sorted(animations_dir.iterdir()):
+        if anim_dir.is_dir():
+            files = sorted(f for f in anim_dir.iterdir()
+                           if f.suffix.lower() in AnimationManager.EXTENSIONS)
+            if files:
+                actions[anim_dir.name] = files
+    return actions
+
+def validate(character_dir) -> tuple:
+    # 返回 (动作 -> 帧文件列表, 错误列表, 警告列表)
+    errors, warnings = [], []
+    animations_dir = character_dir / "animations"
+    if not animations_dir.exists():
+        return {}, [f"找不到动画目录: {animations_dir}"], warnings
+
+    actions = list_actions(animations_dir)
+    if not actions:
+        errors.append("没有任何包含图片的动作目录")
+    elif "站立" not in actions:
+        warnings.append("缺少默认动作“站立”，启动时会使用其它动作")
+
+    sizes = {}  # (宽, 高) -> 帧数
+    for name, files in actions.items():
+        numbers = []
+        for file in files:
+            match = re.search(r"\d+", file.stem)
+            if match:
+                numbers.append(int(match.group()))
+        if numbers and sorted(numbers) != list(range(min(numbers), min(numbers) + len(numbers))):
+            warnings.append(f"{name}: 帧编号不连续")
+
+        for file in files:
+            rel = file.relative_to(animations_dir).as_posix()
+            # 完整解码一次：文件头能读不代表图像数据完好，透明通道也要看解码出的图像
+            image = QImageReader(str(file)).read()
+            if image.isNull():
+                errors.append(f"无法读取图片: {rel}")
+                continue
+            size = (image.width(), image.height())
+            sizes[size] = sizes.get(size, 0) + 1
+            if not image.hasAlphaChannel():
+                warnings.append(f"没有透明通道: {rel}")
+
+        meta_file = animations_dir / name / "meta.json"
+        if meta_file.exists():
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                fps = meta.get("fps")
+                if fps is not None and (not isinstance(fps, (int, float)) or fps <= 0):
+                    warnings.append(f"{name}/meta.json: fps 应为正数")
+                if "loop" in meta and not isinstance(meta["loop"], bool):
+                    warnings.append(f"{name}/meta.json: loop 应为 true 或 false")
+            except (json.JSONDecodeError, IOError, AttributeError) as e:
+                errors.append(f"{name}/meta.json 无法解析: {e}")
+
+    if len(sizes) > 1:
+        detail = ", ".join(f"{w}x{h} ({count} 帧)" for (w, h), count in sizes.items())
+        errors.append(f"帧尺寸不一致: {detail}")
+
+    icon_dir = character_dir / "icon"
+    if not icon_dir.exists() or not any(icon_dir.glob("*.ico")):
+        warnings.append("icon/ 目录中没有 .ico 图标")
+    return actions, errors, warnings
+
+def compile_character(character_dir, actions: dict, scales: list,
+                      delta: bool = False, trim: bool = True) -> dict:
+    animations_dir = character_dir / "animations"
+    sizes = [size_for_scale(scale) for scale in scales]
+    writers = [StoreWriter(animations_dir, actions, w, h, delta, trim) for w, h in sizes]
+
+    manifest_actions = {}
+    source_size = None
+    for name, files in actions.items():
+        meta = AnimationManager.read_meta(animations_dir / name)
+        bbox = QRect()
+        digests = set()
+        duplicates = 0
+        # 每张源图只解码一次，缩放到各个尺寸分别写入
+        for file in files:
+            source = decode_source(file)
+            if not source.isNull():
+                source_size = source_size or [source.width(), source.height()]
+                bbox = bbox.united(content_rect(source))
+                digest = frame_digest(source)
+                if digest in digests:
+                    duplicates += 1
+                digests.add(digest)
+            for writer in writers:
+                frame = QImage() if source.isNull() else scale_frame(source, writer.width, writer.height)
+                writer.add(name, frame)
+        manifest_actions[name] = {
+            "frames": len(files),
+            "fps": meta.get("fps", AnimationManager.DEFAULT_FPS),
+            "loop": meta.get("loop", name not in AnimationManager.ONE_SHOT_ACTIONS),
+            "bbox": [bbox.x(), bbox.y(), bbox.width(), bbox.height()],
+            "duplicates": duplicates,
+        }
+
+    stores = []
+    for scale, writer in zip(scales, writers):
+        result = writer.finish()
+        stores.append({
+            "scale": scale,
+            "size": [writer.width, writer.height],
+            "file": result["path"].name,
+            "delta": delta,
+            "trimmed": trim,
+            "bytes": result["bytes"],
+            "full_bytes": result["full_bytes"],
+            "deduplicated": result["deduplicated"],
+        })
+    # 这次没有重新编译的尺寸，磁盘上的缓存仍然有效时保留在清单中
+    stores.extend(_previous_stores(animations_dir, actions, sizes))
+    stores.sort(key=lambda store: store["size"])
+
+    frames = sum(len(files) for files in actions.values())
+    source_size = source_size or [0, 0]
+    manifest = {
+        "character": character_dir.name,
+        "source_size": source_size,
+        "actions": manifest_actions,
+        "stores": stores,
+        "report": {
+            "frames": frames,
+            "source_bytes": sum(f.stat().st_size for files in actions.values() for f in files),
+            "raw_bytes": frames * source_size[0] * source_size[1] * BYTES_PER_PIXEL,
+            "store_bytes": sum(store["bytes"] for store in stores),
+        },
+    }
+    with open(cache_dir_for(animations_dir) / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+def _previous_stores(animations_dir, actions: dict, rebuilt: list) -> list:
+    # 上一次写入清单的各尺寸缓存中，这次没有重新编译、仍然存在并且与当前源图一致的那些
+    try:
+        with open(cache_dir_for(animations_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("stores", [])
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return []
+    stores = []
+    for store in previous:
+        width, height = store["size"]
+        if (width, height) in rebuilt:
+            continue
+        opened = FrameStore.open(animations_dir, actions, width, height)
+        if opened is not None:
+            stores.append({**store, "delta": opened.delta, "trimmed": opened.trimmed})
+    return stores
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def print_report(manifest: dict):
+    report = manifest["report"]
+    print(f"{manifest['character']}: {len(manifest['actions'])} 个动作, {report['frames']} 帧")
+    for name, action in manifest["actions"].items():
+        x, y, w, h = action["bbox"]
+        print(f"  {name}: {action['frames']} 帧, {action['fps']} 帧/秒, "
+              f"{'循环' if action['loop'] else '不循环'}, 内容范围 {w}x{h}+{x}+{y}, "
+              f"重复 {action['duplicates']} 帧")
+    print(f"编译前: PNG {_mb(report['source_bytes'])}, 解码后 {_mb(report['raw_bytes'])}")
+    for store in manifest["stores"]:
+        w, h = store["size"]
+        encoding = "差分" if store.get("delta") else ("裁剪" if store.get("trimmed") else "整帧")
+        print(f"  {int(store['scale'] * 100)}% ({w}x{h}, {encoding}): {_mb(store['bytes'])} "
+              f"(整帧 {_mb(store['full_bytes'])}, 去重 {store['deduplicated']} 帧) -> {store['file']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="检查并编译角色素材")
+    parser.add_argument("character", nargs="?", default=config.get("character", "firefly"),
+                        help="角色目录名，默认使用 config.json 中的角色")
+    parser.add_argument("--scale", type=float, action="append",
+                        help="要编译的人物比例，可重复指定；默认使用 config.json 中的比例")
+    parser.add_argument("--all", action="store_true",
+                        help="编译右键菜单中的全部人物比例")
+    parser.add_argument("--delta", action="store_true",
+                        help="使用关键帧 + 差分矩形编码")
+    parser.add_argument("--no-trim", action="store_true",
+                        help="关键帧保存整幅画面，不裁剪透明边框")
+    parser.add_argument("--check", action="store_true",
+                        help="只检查角色目录，不编译")
+    args = parser.parse_args()
+
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv)
+    character_dir = config.assets_dir / "characters" / args.character
+    actions, errors, warnings = validate(character_dir)
+    for warning in warnings:
+        print(f"警告: {warning}")
+    for error in errors:
+        print(f"错误: {error}")
+    if errors:
+        sys.exit(1)
+    print(f"检查通过: {len(actions)} 个动作, {sum(len(f) for f in actions.values())} 帧")
+    if args.check:
+        sys.exit(0)
+
+    if args.all:
+        scales = SCALES
+    else:
+        scales = args.scale or [config.get("scale", 1.0)]
+    start = time.perf_counter()
+    manifest = compile_character(character_dir, actions, scales,
+                                 delta=args.delta, trim=not args.no_trim)
+    print_report(manifest)
+    print(f"耗时 {time.perf_counter() - start:.1f} 秒，输出目录: {cache_dir_for(character_dir / 'animations')}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import json
 import os
+import atexit
+import threading
+import time
 from pathlib import Path
 
+from startup_profile import profile
+
 class Config:
     DEFAULT_CONFIG = {
         "pet_x": 100,
@@ -13,7 +18,21 @@ class Config:
         "character": "firefly",
         "animation_mode": "random", # "keep" or "random"
         "scale": 1.0,
+        "frame_cache_mb": 128, # 动画帧缓存的内存上限
+        "source_cache_mb": 32, # 原始分辨率源图缓存上限，用于快速切换比例；放不下当前动作时自动放大
+        "warm_cache_mb": 32, # 最近播放过的动作压缩后保留在内存中的上限，0 表示不压缩保留
+        "hit_mask_cache_mb": 8, # 点击判定位图缓存上限（每帧每像素一位），放不下最长的动作时自动放大
+        "click_through": True, # 点击人物周围的透明区域时穿透到下面的窗口
+        "idle_after_s": 300, # 多少秒没有输入后降低帧率，0 表示不检测
+        "idle_fps": 6, # 空闲时的帧率
+        "sound_buffer": 512, # 混音器缓冲区采样数，越小点击音效延迟越低，过小可能爆音
+        "cpu_budget_pct": 10, # 渲染允许占用单核的百分比，超出时自动降低帧率，0 表示不调节
+        "metrics_file": "", # 定期写入性能指标的 JSON 文件（相对路径相对于程序目录），留空表示不写
+        "metrics_interval_s": 5, # 写入性能指标文件的间隔
+        "metrics_port": 0, # 在 127.0.0.1 的这个端口上提供性能指标（HTTP/JSON），0 表示不监听
+        "pets": [], # 多桌宠模式：每项是一只桌宠的配置分节，如 {"character": "firefly", "scale": 0.5}
     }
+    SAVE_DELAY = 1.0  # 修改后等待这么多秒再写盘，期间的多次修改合并为一次写入
     
     def __init__(self):
         self.base_dir = Path(__file__).parent
@@ -22,6 +41,16 @@ class Config:
         
         self.data = self.load()
         self._update_paths()
+        
+        # 修改先记在内存中，由后台线程延迟写盘；退出时 flush 保证最后一次修改落盘
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._deadline = 0.0
+        self._writer = None
+        self.writes = 0  # 实际写盘次数
+        self.writes_avoided = 0  # 被合并或者值未变化而省掉的写盘次数
+        atexit.register(self.flush)
 
     def _update_paths(self):
         character = self.get("character", "firefly")
@@ -41,20 +70,85 @@ class Config:
         return self.DEFAULT_CONFIG.copy()
     
     def save(self):
+        # 立即写盘
+        with self._write_lock:
+            with self._cond:
+                self._dirty = False
+                text = self._dump()
+            self._write(text)
+    
+    def flush(self):
+        # 有尚未写盘的修改时立即写入；后台线程正在写盘时等它写完，保证返回时最后的修改已经落盘
+        with self._write_lock:
+            with self._cond:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                text = self._dump()
+            self._write(text)
+    
+    def _dump(self) -> str:
+        return json.dumps(self.data, indent=2, ensure_ascii=False)
+    
+    def _write(self, text: str):
+        # 调用方持有 _write_lock：取快照和写盘在同一把锁内，较旧的快照不会覆盖较新的
+        # 先写临时文件再替换，写到一半退出也不会留下损坏的配置
+        tmp_path = self.config_path.with_name(self.config_path.name + ".tmp")
         try:
-            with open(self.config_path, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-        except IOError as e:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.config_path)
+            self.writes += 1
+        except OSError as e:
             print(f"保存配置失败: {e}")
     
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+                # 每次修改都会推迟截止时间
+                remaining = self._deadline - time.monotonic()
+                while self._dirty and remaining > 0:
+                    self._cond.wait(remaining)
+                    remaining = self._deadline - time.monotonic()
+            # 先取写盘锁再取快照（与 flush 的加锁顺序相同），期间 flush 可能已经写过
+            with self._write_lock:
+                with self._cond:
+                    if not self._dirty:
+                        continue
+                    self._dirty = False
+                    text = self._dump()
+                self._write(text)
+    
     def get(self, key: str, default=None):
         return self.data.get(key, default)
     
     def set(self, key: str, value):
-        self.data[key] = value
+        self.set_in(self.data, key, value)
         if key == "character":
             self._update_paths()
-        self.save()
+    
+    def set_in(self, data: dict, key: str, value):
+        # data 为根配置或其中某个桌宠的分节
+        with self._cond:
+            if key in data and data[key] == value:
+                self.writes_avoided += 1
+                return
+            data[key] = value
+            if self._dirty:
+                self.writes_avoided += 1
+            self._dirty = True
+            self._deadline = time.monotonic() + self.SAVE_DELAY
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="config", daemon=True)
+                self._writer.start()
+            self._cond.notify()
+    
+    def pet_sections(self) -> list:
+        # 多桌宠模式下每只桌宠的配置；没有配置 pets 时为空，只显示一只桌宠并直接使用根配置
+        pets = self.data.get("pets") or []
+        return [ConfigSection(self, section) for section in pets if isinstance(section, dict)]
     
     def load_dialogs(self) -> list:
         if self.dialogs_path.exists():
@@ -79,4 +173,33 @@ class Config:
             "无论发生什么，我都不会放弃希望。",
         ]
 
+class ConfigSection:
+    # 单只桌宠的配置分节：先查分节，没有时退回根配置；接口与 Config 相同
+    def __init__(self, root: Config, data: dict):
+        self.root = root
+        self.data = data
+        self.assets_dir = root.assets_dir
+        self._update_paths()
+    
+    def _update_paths(self):
+        character = self.get("character", "firefly")
+        self.character_dir = self.assets_dir / "characters" / character
+        self.animations_dir = self.character_dir / "animations"
+        self.sounds_dir = self.root.sounds_dir
+        self.dialogs_path = self.root.dialogs_path
+    
+    def get(self, key: str, default=None):
+        if key in self.data:
+            return self.data[key]
+        return self.root.get(key, default)
+    
+    def set(self, key: str, value):
+        self.root.set_in(self.data, key, value)
+        if key == "character":
+            self._update_paths()
+    
+    def load_dialogs(self) -> list:
+        return self.root.load_dialogs()
+
 config = Config()
+profile.mark("config")
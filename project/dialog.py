@@ -1,8 +1,10 @@
 from PyQt5.QtWidgets import QWidget, QLabel
-from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve
+from PyQt5.QtCore import Qt, QPropertyAnimation, QEasingCurve
 from PyQt5.QtGui import QFont
 import random
 
+from scheduler import scheduler
+
 class DialogBubble(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -11,7 +13,7 @@ class DialogBubble(QWidget):
         
         self._setup_ui()
         
-        self.hide_timer = QTimer()
+        self.hide_timer = scheduler.timer()
         self.hide_timer.timeout.connect(self.hide_bubble)
         self.hide_timer.setSingleShot(True)
     
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+
+# 按字节预算做 LRU 淘汰的帧缓存，键为 (角色, 动作, 帧索引, 宽, 高)
+# 带内容摘要放入的帧会去重：像素完全相同的帧共用同一个图像对象，内存只计算一次
+# 默认存放 QImage；传入 cost 时可以存放其它对象（例如压缩后的帧），cost(对象) 返回占用的字节数
+class FrameCache:
+    def __init__(self, budget_bytes: int, cost=None):
+        self.configured_bytes = max(0, int(budget_bytes))
+        self.budget_bytes = self.configured_bytes
+        self._reserved = {}  # 使用方 -> 它至少需要的字节数
+        self._cost = cost or self.frame_cost
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.deduplicated = 0
+        self._entries = OrderedDict()  # key -> (frame, cost, digest)
+        self._shared = {}  # digest -> [frame, 引用数]
+    
+    @staticmethod
+    def frame_cost(frame) -> int:
+        return frame.width() * frame.height() * max(1, frame.depth()) // 8
+    
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def peek(self, key):
+        # 不计入命中统计、也不改变淘汰顺序
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+    
+    def put(self, key, frame, digest: str = None):
+        self.remove(key)
+        cost = self._cost(frame)
+        if digest:
+            shared = self._shared.get(digest)
+            if shared is not None:
+                # 已有相同内容的帧：引用同一个对象，不重复计入内存
+                frame = shared[0]
+                shared[1] += 1
+                self.deduplicated += 1
+            else:
+                self._shared[digest] = [frame, 1]
+                self.used_bytes += cost
+        else:
+            self.used_bytes += cost
+        self._entries[key] = (frame, cost, digest)
+        self._evict()
+        return frame
+    
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._release(entry)
+    
+    def _release(self, entry):
+        _, cost, digest = entry
+        if digest:
+            shared = self._shared[digest]
+            shared[1] -= 1
+            if shared[1] > 0:
+                return
+            del self._shared[digest]
+        self.used_bytes -= cost
+    
+    def contains(self, key) -> bool:
+        return key in self._entries
+    
+    def set_budget(self, budget_bytes: int):
+        self.configured_bytes = max(0, int(budget_bytes))
+        self._update_budget()
+    
+    def reserve(self, owner, nbytes: int):
+        # 使用方登记它至少需要的字节数（例如当前动作的全部帧），预算取配置值与各方登记之和中较大的一个
+        self._reserved[owner] = max(0, int(nbytes))
+        self._update_budget()
+    
+    def _update_budget(self):
+        self.budget_bytes = max(self.configured_bytes, sum(self._reserved.values()))
+        self._evict()
+    
+    def clear(self):
+        self._entries.clear()
+        self._shared.clear()
+        self.used_bytes = 0
+    
+    def _evict(self):
+        # 最新放入的一帧总是保留，保证当前帧可以显示
+        while self.used_bytes > self.budget_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._release(entry)
+            self.evictions += 1
+    
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "unique_frames": len(self._shared) + sum(1 for e in self._entries.values() if not e[2]),
+            "used_bytes": self.used_bytes,
+            "budget_bytes": self.budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "deduplicated": self.deduplicated,
+        }
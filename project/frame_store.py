@@ -0,0 +1,272 @@
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtCore import QRect, QPoint
+
+from frame_loader import content_rect
+
+# 预缩放帧的磁盘缓存：每个尺寸一个原始 ARGB32 数据文件 (.bin) 加一个索引文件 (.json)
+# 运行时通过 mmap 映射，帧直接包装成指向映射内存的 QImage，不复制像素。
+# 多个桌宠进程映射同一个文件时共享系统页缓存，没被播放的帧也不会被读入内存。
+#
+# 索引中每帧记录 [偏移, x, y, 宽, 高, 标志]。普通缓存每帧都是整幅画面的关键帧；
+# 差分缓存 (delta) 只在关键帧保存整幅画面，其余帧只保存与上一帧相比变化的矩形区域。
+# 裁剪缓存 (trimmed) 的关键帧只保存非透明像素的外接矩形，矩形以外视为透明。
+
+STORE_VERSION = 3
+FLAG_KEYFRAME = 1  # 关键帧：替换整幅画面，而不是叠加在上一帧上
+STORE_FORMAT = QImage.Format_ARGB32_Premultiplied
+BYTES_PER_PIXEL = 4
+KEYFRAME_INTERVAL = 30  # 差分缓存中每隔多少帧插入一个关键帧，限制随机跳转时需要叠加的补丁数
+
+# 人物比例对应的整帧尺寸，缓存按这些尺寸构建；放在这里，离线编译脚本不必导入窗口相关的模块
+BASE_WIDTH = 350
+BASE_HEIGHT = 420
+SCALES = [0.5, 0.75, 1.0, 1.25, 1.5, 2.0]  # 右键菜单中可选的人物比例
+
+# 已打开的映射在进程生命周期内保持有效：QImage 在信号中按值传递后不再持有缓冲区引用，
+# 提前 unmap 会让这些图像指向无效内存。同一文件只映射一次，供所有管理器共用。
+_open_stores = {}
+
+def size_for_scale(scale: float) -> tuple:
+    return int(BASE_WIDTH * scale), int(BASE_HEIGHT * scale)
+
+def cache_dir_for(animations_dir: Path) -> Path:
+    return animations_dir.parent / "frame_cache"
+
+def store_paths(cache_dir: Path, width: int, height: int) -> tuple:
+    stem = f"{width}x{height}"
+    return cache_dir / f"{stem}.bin", cache_dir / f"{stem}.json"
+
+def source_signature(animations_dir: Path, animations: dict) -> dict:
+    # 源文件的修改时间和大小，任意一帧变化都会使缓存失效
+    signature = {}
+    for files in animations.values():
+        for file in files:
+            stat = file.stat()
+            rel = file.relative_to(animations_dir).as_posix()
+            signature[rel] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+class FrameStore:
+    def __init__(self, bin_path: Path, index: dict):
+        self.width = index["width"]
+        self.height = index["height"]
+        self.delta = index.get("delta", False)
+        self.trimmed = index.get("trimmed", False)
+        self.deduplicated = index.get("deduplicated", 0)  # 构建时合并掉的重复帧数
+        self._frames = index["actions"]  # 动作名 -> 每帧的 [偏移, x, y, 宽, 高, 标志]
+        self.reads = 0
+        
+        with open(bin_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+    
+    @classmethod
+    def open(cls, animations_dir: Path, animations: dict, width: int, height: int,
+             partial: bool = False):
+        # animations: 动作名 -> 源文件列表；缓存不存在或已过期时返回 None
+        # partial 为 True 时只校验给出的这些文件（启动时只登记了部分动作）
+        bin_path, index_path = store_paths(cache_dir_for(animations_dir), width, height)
+        if not bin_path.exists() or not index_path.exists():
+            return None
+        
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") != STORE_VERSION:
+                return None
+            if index.get("width") != width or index.get("height") != height:
+                return None
+            sources = index.get("sources") or {}
+            signature = source_signature(animations_dir, animations)
+            if partial:
+                if any(sources.get(rel) != value for rel, value in signature.items()):
+                    return None
+            elif sources != signature:
+                return None
+            
+            stat = bin_path.stat()
+            store_key = (str(bin_path), stat.st_mtime_ns, stat.st_size)
+            store = _open_stores.get(store_key)
+            if store is None:
+                store = cls(bin_path, index)
+                _open_stores[store_key] = store
+            return store
+        except (json.JSONDecodeError, KeyError, OSError, ValueError):
+            return None
+    
+    def has_frame(self, action: str, index: int) -> bool:
+        entries = self._frames.get(action)
+        return entries is not None and 0 <= index < len(entries)
+    
+    def frame_rect(self, action: str, index: int) -> QRect:
+        _, x, y, w, h, _ = self._frames[action][index]
+        return QRect(x, y, w, h)
+    
+    def is_keyframe(self, action: str, index: int) -> bool:
+        return bool(self._frames[action][index][5] & FLAG_KEYFRAME)
+    
+    def keyframe_before(self, action: str, index: int) -> int:
+        while index > 0 and not self.is_keyframe(action, index):
+            index -= 1
+        return index
+    
+    def frame_image(self, action: str, index: int) -> QImage:
+        # 零拷贝：QImage 直接指向映射内存，只读访问不会触发复制
+        # 差分缓存中返回的是该帧的补丁，位置见 frame_rect()
+        offset, _, _, w, h, _ = self._frames[action][index]
+        self.reads += 1
+        if w == 0 or h == 0:
+            return QImage()
+        data = self._view[offset:offset + w * h * BYTES_PER_PIXEL]
+        return QImage(data, w, h, w * BYTES_PER_PIXEL, STORE_FORMAT)
+    
+    def compose(self, action: str, index: int) -> tuple:
+        # 从前一个关键帧开始把补丁叠加到独立的图像上，返回 (有内容部分的图像, 它在整帧中的位置)
+        # 不碰播放用的画布，可以在工作线程中调用
+        keyframe = self.keyframe_before(action, index)
+        if keyframe == index:
+            return self.frame_image(action, index), self.frame_rect(action, index).topLeft()
+        content = QRect()
+        for i in range(keyframe, index + 1):
+            content = content.united(self.frame_rect(action, i))
+        if content.isEmpty():
+            return QImage(), QPoint()
+        image = QImage(content.size(), STORE_FORMAT)
+        image.fill(0)
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        for i in range(keyframe, index + 1):
+            rect = self.frame_rect(action, i)
+            if not rect.isEmpty():
+                painter.drawImage(rect.topLeft() - content.topLeft(), self.frame_image(action, i))
+        painter.end()
+        return image, content.topLeft()
+    
+    @property
+    def mapped_bytes(self) -> int:
+        return len(self._map)
+
+class StoreWriter:
+    # 按播放顺序逐帧写入一个尺寸的缓存；同时构建多个尺寸时，每张源图只需解码一次
+    # 先写临时文件，finish() 时再替换，避免留下半截缓存
+    def __init__(self, animations_dir: Path, animations: dict, width: int, height: int,
+                 delta: bool = False, trim: bool = False):
+        self.animations_dir = animations_dir
+        self.animations = animations
+        self.width = width
+        self.height = height
+        self.delta = delta
+        self.trim = trim
+        cache_dir = cache_dir_for(animations_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.bin_path, self.index_path = store_paths(cache_dir, width, height)
+        self._tmp_bin = self.bin_path.with_suffix(".bin.tmp")
+        self._file = open(self._tmp_bin, "wb")
+        self.actions = {}
+        self.offset = 0
+        self.written = {}  # 数据摘要 -> 偏移，内容相同的帧（或补丁）只写一次
+        self.deduplicated = 0
+        self._previous = None
+        self._full = QRect(0, 0, width, height)
+    
+    def add(self, name: str, image: QImage):
+        # image 必须已经是本尺寸、STORE_FORMAT 格式的帧
+        entries = self.actions.setdefault(name, [])
+        if not entries:
+            self._previous = None
+        if image.isNull():
+            image = QImage(self.width, self.height, STORE_FORMAT)
+            image.fill(0)
+        
+        keyframe = True
+        if self.delta and self._previous is not None and len(entries) % KEYFRAME_INTERVAL != 0:
+            rect = diff_rect(self._previous, image)
+            keyframe = False
+            # 变化区域太大时直接存整帧，额外得到一个关键帧
+            if rect.width() * rect.height() * 2 > self.width * self.height:
+                keyframe = True
+        if keyframe:
+            # 关键帧替换整幅画面；裁剪时只保存非透明区域，其余部分视为透明
+            rect = content_rect(image) if self.trim else self._full
+        
+        data = crop_bytes(image, rect)
+        flags = FLAG_KEYFRAME if keyframe else 0
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if data and digest in self.written:
+            entries.append([self.written[digest], rect.x(), rect.y(), rect.width(), rect.height(), flags])
+            self.deduplicated += 1
+        else:
+            self._file.write(data)
+            self.written[digest] = self.offset
+            entries.append([self.offset, rect.x(), rect.y(), rect.width(), rect.height(), flags])
+            self.offset += len(data)
+        self._previous = image
+    
+    def finish(self) -> dict:
+        self._file.close()
+        index = {
+            "version": STORE_VERSION,
+            "width": self.width,
+            "height": self.height,
+            "delta": self.delta,
+            "trimmed": self.trim,
+            "deduplicated": self.deduplicated,
+            "sources": source_signature(self.animations_dir, self.animations),
+            "actions": self.actions,
+        }
+        tmp_index = self.index_path.with_suffix(".json.tmp")
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        
+        # 索引最后替换，读取方只会看到完整的缓存
+        os.replace(self._tmp_bin, self.bin_path)
+        os.replace(tmp_index, self.index_path)
+        frames = sum(len(e) for e in self.actions.values())
+        return {
+            "frames": frames,
+            "bytes": self.offset,
+            "deduplicated": self.deduplicated,
+            "full_bytes": frames * self.width * self.height * BYTES_PER_PIXEL,
+            "path": self.bin_path,
+        }
+
+def _rows(image: QImage) -> list:
+    stride = image.width() * BYTES_PER_PIXEL
+    data = image.constBits().asstring(image.sizeInBytes())
+    step = image.bytesPerLine()
+    return [data[y * step:y * step + stride] for y in range(image.height())]
+
+def diff_rect(a: QImage, b: QImage) -> QRect:
+    # 两帧之间有差异像素的最小外接矩形；逐行比较字节，行内用大整数异或找首尾差异
+    rows_a, rows_b = _rows(a), _rows(b)
+    changed = [y for y in range(len(rows_a)) if rows_a[y] != rows_b[y]]
+    if not changed:
+        return QRect()
+    
+    row_bytes = len(rows_a[0])
+    left, right = row_bytes, 0
+    for y in changed:
+        x = int.from_bytes(rows_a[y], "big") ^ int.from_bytes(rows_b[y], "big")
+        # 最高位对应行首字节，最低位对应行尾字节
+        first = row_bytes - (x.bit_length() + 7) // 8
+        last = row_bytes - 1 - ((x & -x).bit_length() - 1) // 8
+        left = min(left, first)
+        right = max(right, last)
+    
+    x0 = left // BYTES_PER_PIXEL
+    x1 = right // BYTES_PER_PIXEL
+    return QRect(x0, changed[0], x1 - x0 + 1, changed[-1] - changed[0] + 1)
+
+def crop_bytes(image: QImage, rect: QRect) -> bytes:
+    # 按行取出矩形区域内的像素，行间无填充
+    if rect.isEmpty():
+        return b""
+    rows = _rows(image)
+    start = rect.x() * BYTES_PER_PIXEL
+    end = start + rect.width() * BYTES_PER_PIXEL
+    return b"".join(rows[y][start:end] for y in range(rect.y(), rect.y() + rect.height()))
@@ -0,0 +1,51 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+import time
+
+class FrameRateGovernor(QObject):
+    limit_changed = pyqtSignal(object)  # 新的帧率上限，None 表示不限制
+
+    LEVELS = [None, 12, 8]  # 逐级降低的帧率上限
+    WINDOW = 2.0  # 统计负载的时间窗口（秒）
+    HEADROOM = 0.6  # 升回上一级后预计的负载低于预算的这个比例时才升级，避免来回抖动
+
+    def __init__(self, budget: float = 0.1):
+        super().__init__()
+        self.budget = budget  # 渲染允许占用单核时间的比例，0 表示不调节
+        self.level = 0
+        self.load = 0.0  # 最近一个窗口内的实测负载
+        self.changes = 0
+        self._window_start = None
+        self._busy_start = 0.0
+
+    @property
+    def limit(self):
+        return self.LEVELS[self.level]
+
+    def sample(self, busy: float, fps: float, full_fps: float):
+        # busy 为累计的渲染耗时（秒），fps 为当前实际帧率，full_fps 为不限制时的帧率
+        now = time.perf_counter()
+        if self._window_start is None or now - self._window_start > self.WINDOW * 3:
+            # 首次采样或者刚从暂停中恢复，重新开始统计
+            self._window_start = now
+            self._busy_start = busy
+            return
+        elapsed = now - self._window_start
+        if elapsed < self.WINDOW:
+            return
+        self.load = (busy - self._busy_start) / elapsed
+        self._window_start = now
+        self._busy_start = busy
+        if self.budget <= 0 or fps <= 0:
+            return
+
+        if self.load > self.budget and self.level < len(self.LEVELS) - 1:
+            self._set_level(self.level + 1)
+        elif self.level > 0:
+            higher = self.LEVELS[self.level - 1] or full_fps
+            if self.load * higher / fps < self.budget * self.HEADROOM:
+                self._set_level(self.level - 1)
+
+    def _set_level(self, level: int):
+        self.level = level
+        self.changes += 1
+        self.limit_changed.emit(self.limit)
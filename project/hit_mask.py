@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from PyQt5.QtGui import QImage, QBitmap, QRegion
+from PyQt5.QtCore import QPoint, QRect
+
+# 按透明度做点击判定的位图：每个像素一位，行格式与 QImage.Format_MonoLSB 相同，
+# 查询某一点只需取一个字节，不必每帧调用 QPixmap.mask()。
+# 位图在解码线程中随帧一起生成，按 (角色, 动作, 帧索引, 宽, 高) 缓存，切换比例后各自缓存。
+# 位图只覆盖帧的非透明部分，并记录它在整帧中的位置，查询和区域都使用整帧坐标。
+
+def _bits_table(threshold: int) -> bytes:
+    # alpha 字节 -> 字符 '0' / '1'，供 bytes.translate 把一行的 alpha 转成二进制数字串
+    return bytes(ord("1") if a >= threshold else ord("0") for a in range(256))
+
+class HitMask:
+    def __init__(self, width: int, height: int, bits: bytes, origin: QPoint = None):
+        self.origin = origin if origin is not None else QPoint(0, 0)
+        self.width = width
+        self.height = height
+        self.stride = (width + 7) // 8
+        self.bits = bits
+        self._region = None
+
+    @classmethod
+    def from_image(cls, image: QImage, threshold: int = 1, bounds: QRect = None,
+                   origin: QPoint = None):
+        # image 为 ARGB32（预乘）格式，origin 为它在整帧中的位置；
+        # bounds 为 image 中已知的内容区域，区域以外按透明处理，不必逐行扫描
+        width, height = image.width(), image.height()
+        stride = (width + 7) // 8
+        area = QRect(0, 0, width, height)
+        if bounds is not None:
+            area = area.intersected(bounds)
+        empty = bytes(stride)
+        rows = [empty] * height
+        if not area.isEmpty():
+            table = _bits_table(threshold)
+            step = image.bytesPerLine()
+            data = image.constBits().asstring(image.sizeInBytes())
+            # 小端 ARGB32 每个像素的第 4 个字节是 alpha
+            start = area.x() * 4 + 3
+            end = (area.x() + area.width()) * 4
+            for y in range(area.y(), area.y() + area.height()):
+                digits = data[y * step + start:y * step + end:4].translate(table)
+                if b"1" not in digits:
+                    continue
+                # 数字串反转后最低位对应最左边的像素，与 MonoLSB 的位序一致
+                rows[y] = (int(digits[::-1], 2) << area.x()).to_bytes(stride, "little")
+        return cls(width, height, b"".join(rows), origin)
+
+    def contains(self, x: int, y: int) -> bool:
+        x -= self.origin.x()
+        y -= self.origin.y()
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return bool(self.bits[y * self.stride + (x >> 3)] >> (x & 7) & 1)
+
+    def region(self) -> QRegion:
+        # 不透明像素组成的区域，用作窗口的输入区域；第一次使用时生成
+        if self._region is None:
+            image = QImage(self.bits, self.width, self.height, self.stride, QImage.Format_MonoLSB)
+            # 位为 1 的像素对应颜色表第 1 项，QBitmap 中颜色 1 表示区域内
+            image.setColorTable([0, 0xff000000])
+            self._region = QRegion(QBitmap.fromImage(image)).translated(self.origin)
+        return self._region
+
+    @property
+    def cost(self) -> int:
+        return len(self.bits)
+
+class HitMaskCache:
+    # 按字节预算做 LRU 淘汰，可以在多只桌宠之间共享，键中包含角色名和尺寸
+    def __init__(self, budget_bytes: int):
+        self.configured_bytes = max(0, int(budget_bytes))
+        self.budget_bytes = self.configured_bytes
+        self.used_bytes = 0
+        self.built = 0
+        self.hits = 0
+        self._entries = OrderedDict()  # key -> HitMask
+        self._reserved = {}  # 使用方 -> 它至少需要的字节数
+
+    def reserve(self, owner, nbytes: int):
+        # 使用方登记完整播放一个动作所需的位图字节数，预算取配置值与各方登记之和中较大的一个，
+        # 否则较长的动作播放一轮之后位图就被淘汰，下一轮又要重新生成
+        self._reserved[owner] = max(0, int(nbytes))
+        self.budget_bytes = max(self.configured_bytes, sum(self._reserved.values()))
+        self._evict()
+
+    def get(self, key) -> HitMask:
+        # 没有缓存时返回 None
+        mask = self._entries.get(key)
+        if mask is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return mask
+
+    def contains(self, key) -> bool:
+        return key in self._entries
+
+    def put(self, key, mask: HitMask):
+        if key in self._entries:
+            return
+        self.built += 1
+        self._entries[key] = mask
+        self.used_bytes += mask.cost
+        self._evict()
+
+    def _evict(self):
+        while self.used_bytes > self.budget_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self.used_bytes -= old.cost
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "used_bytes": self.used_bytes,
+            "budget_bytes": self.budget_bytes,
+            "built": self.built,
+            "hits": self.hits,
+        }
@@ -1,57 +1,182 @@
 import sys
+import argparse
+import json
+from pathlib import Path
+from startup_profile import profile
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QIcon
 
-from pet import Pet
+from pet import Pet, PetResources
 from tray import TrayManager
+from metrics import MetricsReporter
 from config import config
 
+profile.mark("imports")
+
 class FireflyPetApp:
-    def __init__(self):
-        self.app = QApplication(sys.argv)
+    STARTUP_FALLBACK_MS = 1000  # 迟迟没有显示出第一帧（隐藏、没有动作）时也继续启动
+    PET_SPACING = 200  # 多桌宠模式下没有保存位置的桌宠依次向右排开
+    
+    def __init__(self, argv: list = None, profile_startup=None, quit_after_startup: bool = False):
+        self.app = QApplication(argv if argv is not None else sys.argv)
         self.app.setQuitOnLastWindowClosed(False)
+        profile.mark("qapplication")
+        
+        # profile_startup 为 True 时只打印启动耗时，为路径时同时写入 JSON
+        self.profile_startup = profile_startup
+        self.quit_after_startup = quit_after_startup
+        if profile_startup or quit_after_startup:
+            profile.when_done(["first_frame", "tray_ready"], self._report_startup)
         
-        self.pet = Pet()
+        # 配置了 pets 时在同一进程中显示多只桌宠，它们共用缓存、解码线程、动画时钟和托盘
+        self.resources = PetResources()
+        self.pets = [Pet(section, self.resources) for section in self._pet_sections()]
+        self.pet = self.pets[0]
+        self.tray = None
+        self.metrics = None
+        self._startup_steps = None
         
         # 设置程序图标
-        icon_path = config.assets_dir / "characters" / "firefly" / "icon" / "firfly_64_64.ico"
-        if icon_path.exists():
-            self.app_icon = QIcon(str(icon_path))
+        self.icon_path = config.assets_dir / "characters" / "firefly" / "icon" / "firfly_64_64.ico"
+        if self.icon_path.exists():
+            self.app_icon = QIcon(str(self.icon_path))
             self.app.setWindowIcon(self.app_icon)
-            self.pet.setWindowIcon(self.app_icon)
+            for pet in self.pets:
+                pet.setWindowIcon(self.app_icon)
         else:
             self.app_icon = QIcon(str(config.assets_dir / "icon.png"))
-            
-        self.tray = TrayManager(icon_path if icon_path.exists() else config.assets_dir / "icon.png")
         
+        for pet in self.pets:
+            pet.quit_requested.connect(self._quit)
+            pet.first_frame_shown.connect(self._continue_startup)
+    
+    def _pet_sections(self) -> list:
+        sections = config.pet_sections()
+        if not sections:
+            return [config]
+        x = config.get("pet_x", 100)
+        for i, section in enumerate(sections):
+            if "pet_x" not in section.data:
+                section.data["pet_x"] = x + i * self.PET_SPACING
+        return sections
+    
+    def _continue_startup(self):
+        # 分阶段启动：第一帧显示后，把其余初始化拆成小步骤逐个放进事件循环
+        if self._startup_steps is not None:
+            return
+        self._startup_steps = [step for pet in self.pets for step in pet.deferred_steps()]
+        self._startup_steps.append(self._setup_metrics)
+        self._startup_steps.append(self._setup_tray)
+        QTimer.singleShot(0, self._run_startup_step)
+    
+    def _run_startup_step(self):
+        if not self._startup_steps:
+            profile.mark("startup_complete")
+            return
+        step = self._startup_steps.pop(0)
+        step()
+        QTimer.singleShot(0, self._run_startup_step)
+    
+    def _setup_metrics(self):
+        # metrics_file 为相对路径时相对于程序目录；留空则不写文件，metrics_port 为 0 则不监听端口
+        dump_path = None
+        if config.get("metrics_file"):
+            dump_path = Path(config.get("metrics_file"))
+            if not dump_path.is_absolute():
+                dump_path = config.base_dir / dump_path
+        self.metrics = MetricsReporter(self.pets, self.resources, dump_path,
+                                       config.get("metrics_interval_s", 5),
+                                       config.get("metrics_port", 0))
+        self.metrics.start()
+    
+    def _setup_tray(self):
+        icon_path = self.icon_path if self.icon_path.exists() else config.assets_dir / "icon.png"
+        self.tray = TrayManager(icon_path)
         self._connect_signals()
         self._sync_tray_state()
+        self.tray.show()
+        profile.mark("tray_ready")
     
     def _connect_signals(self):
-        self.tray.show_hide_toggled.connect(self.pet.toggle_visibility)
-        self.tray.sound_toggled.connect(self.pet.set_sound)
-        self.tray.dialog_toggled.connect(self.pet.set_dialog)
+        self.tray.show_hide_toggled.connect(self._toggle_visibility)
+        self.tray.sound_toggled.connect(self._set_sound)
+        self.tray.dialog_toggled.connect(self._set_dialog)
         self.tray.quit_requested.connect(self._quit)
-        self.pet.quit_requested.connect(self._quit)
+        self.tray.metrics_opened.connect(self.metrics.watch)
+        self.tray.metrics_closed.connect(self.metrics.unwatch)
+        self.tray.copy_metrics_requested.connect(self._copy_metrics)
+        self.metrics.updated.connect(self.tray.set_metrics)
+        for pet in self.pets:
+            pet.animation_manager.fps_changed.connect(self._update_tray_fps)
     
     def _sync_tray_state(self):
         self.tray.set_sound(config.get("sound_enabled", True))
         self.tray.set_dialog(config.get("dialog_enabled", True))
+        self._update_tray_fps()
+    
+    def _update_tray_fps(self, *args):
+        self.tray.set_fps(max(pet.animation_manager.effective_fps for pet in self.pets))
+    
+    def _toggle_visibility(self):
+        # 只要还有一只可见就全部隐藏，否则全部显示
+        visible = any(pet.isVisible() for pet in self.pets)
+        for pet in self.pets:
+            if pet.isVisible() == visible:
+                pet.toggle_visibility()
+    
+    def _set_sound(self, enabled: bool):
+        # 音效和对话气泡开关是全局设置，保存在外层配置中
+        self.resources.sound_manager.set_enabled(enabled)
+        config.set("sound_enabled", enabled)
+    
+    def _set_dialog(self, enabled: bool):
+        for pet in self.pets:
+            pet.set_dialog(enabled)
+        config.set("dialog_enabled", enabled)
+    
+    def _copy_metrics(self):
+        snapshot = self.metrics.snapshot()
+        self.app.clipboard().setText(json.dumps(snapshot, indent=2, ensure_ascii=False))
     
     def _quit(self):
-        self.pet.cleanup()
-        self.tray.hide()
+        if self.metrics is not None:
+            self.metrics.stop()
+        for pet in self.pets:
+            pet.cleanup()
+        self.resources.shutdown()
+        if self.tray is not None:
+            self.tray.hide()
+        config.flush()
         self.app.quit()
     
+    def _report_startup(self):
+        if self.profile_startup:
+            path = None if self.profile_startup is True else self.profile_startup
+            profile.report(path)
+        if self.quit_after_startup:
+            QTimer.singleShot(0, self._quit)
+    
     def run(self):
-        self.pet.show()
-        self.tray.show()
+        for pet in self.pets:
+            pet.show()
+        profile.mark("window_shown")
+        QTimer.singleShot(self.STARTUP_FALLBACK_MS, self._continue_startup)
         
         return self.app.exec_()
 
+def parse_args(argv: list):
+    parser = argparse.ArgumentParser(description="流萤桌面宠物")
+    parser.add_argument("--profile-startup", nargs="?", const=True, metavar="JSON",
+                        help="启动完成（首帧显示、托盘就绪）后打印各阶段耗时，给出路径时同时写入 JSON")
+    parser.add_argument("--quit-after-startup", action="store_true",
+                        help="启动完成后立即退出，便于脚本反复测量")
+    # 其余参数原样交给 Qt
+    return parser.parse_known_args(argv[1:])
+
 def main():
-    app = FireflyPetApp()
+    args, qt_args = parse_args(sys.argv)
+    app = FireflyPetApp([sys.argv[0]] + qt_args, args.profile_startup, args.quit_after_startup)
     sys.exit(app.run())
 
 if __name__ == "__main__":
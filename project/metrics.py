@@ -0,0 +1,133 @@
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from PyQt5.QtNetwork import QTcpServer, QHostAddress
+import json
+import os
+import time
+from pathlib import Path
+
+from process_stats import process_rss_bytes
+from scheduler import scheduler
+
+# 运行时性能指标：从各个管理器的计数器汇总成一份快照，供托盘的“性能”子菜单显示，
+# 也可以定期写入文件或通过只监听本机的端口读取，用于排查“风扇狂转”之类的问题
+
+class MetricsReporter(QObject):
+    updated = pyqtSignal(dict)
+
+    WATCH_INTERVAL_MS = 1000  # 性能菜单打开时的刷新间隔
+
+    def __init__(self, pets: list, resources, dump_path: Path = None,
+                 dump_interval: float = 5.0, port: int = 0):
+        super().__init__()
+        self.pets = pets
+        self.resources = resources
+        self.dump_path = dump_path
+        self.port = port
+        self.server = None
+
+        # 只有打开了性能菜单或配置了指标文件时才定期采集，平时不产生任何唤醒
+        self._watchers = 0
+        self.timer = scheduler.timer()
+        self.timer.setTimerType(Qt.VeryCoarseTimer)
+        self.timer.timeout.connect(self._on_timer)
+        self._dump_interval = max(1.0, dump_interval)
+        self._last_dump = 0.0
+
+    def start(self):
+        if self.dump_path is not None:
+            self._schedule()
+        if self.port:
+            self._listen()
+
+    def stop(self):
+        self.timer.stop()
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def watch(self):
+        # 性能菜单打开期间每秒刷新一次
+        self._watchers += 1
+        self.updated.emit(self.snapshot())
+        self._schedule()
+
+    def unwatch(self):
+        self._watchers = max(0, self._watchers - 1)
+        self._schedule()
+
+    def _schedule(self):
+        if self._watchers:
+            self.timer.start(self.WATCH_INTERVAL_MS)
+        elif self.dump_path is not None:
+            self.timer.start(int(self._dump_interval * 1000))
+        else:
+            self.timer.stop()
+
+    def _on_timer(self):
+        snapshot = self.snapshot()
+        if self._watchers:
+            self.updated.emit(snapshot)
+        now = time.monotonic()
+        if self.dump_path is not None and now - self._last_dump >= self._dump_interval - 0.5:
+            self._last_dump = now
+            self._dump(snapshot)
+
+    def snapshot(self) -> dict:
+        resources = self.resources
+        return {
+            "time": time.time(),
+            "rss_mb": round(process_rss_bytes() / 1024 / 1024, 1),
+            "frames_decoded": resources.loader.decoded_count,
+            "caches_mb": {
+                "frames": round(resources.frame_cache.used_bytes / 1024 / 1024, 1),
+                "compressed": round(resources.warm_cache.used_bytes / 1024 / 1024, 1),
+                "sources": round(resources.source_cache.used_bytes / 1024 / 1024, 1),
+                "hit_masks": round(resources.hit_masks.used_bytes / 1024 / 1024, 1),
+            },
+            "scheduler": scheduler.stats(),
+            "sound": resources.sound_manager.metrics(),
+            "pets": [pet.metrics() for pet in self.pets],
+        }
+
+    def _dump(self, snapshot: dict):
+        # 与配置文件相同，先写临时文件再替换，读取方不会看到写了一半的文件
+        tmp_path = self.dump_path.with_name(self.dump_path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.dump_path)
+        except OSError as e:
+            print(f"写入性能指标失败: {e}")
+            self.dump_path = None
+            self._schedule()
+
+    def _listen(self):
+        # 只监听本机回环地址，每个请求返回一份 JSON 快照后关闭连接，可以直接用 curl 或浏览器查看
+        self.server = QTcpServer(self)
+        if not self.server.listen(QHostAddress.LocalHost, self.port):
+            print(f"性能指标端口 {self.port} 监听失败: {self.server.errorString()}")
+            self.server = None
+            return
+        self.server.newConnection.connect(self._on_connection)
+
+    def _on_connection(self):
+        while self.server is not None and self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.disconnected.connect(socket.deleteLater)
+            # 收到请求之后再回复；先读掉请求内容，否则关闭连接时可能发出 RST，客户端读不到回复
+            socket.readyRead.connect(lambda socket=socket: self._respond(socket))
+
+    def _respond(self, socket):
+        socket.readAll()
+        if socket.property("answered"):
+            return
+        socket.setProperty("answered", True)
+        body = json.dumps(self.snapshot(), indent=2, ensure_ascii=False).encode("utf-8")
+        header = (
+            "HTTP/1.0 200 OK\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        socket.write(header + body)
+        socket.disconnectFromHost()
@@ -1,26 +1,62 @@
-from PyQt5.QtWidgets import QWidget, QLabel, QMenu, QAction
-from PyQt5.QtCore import Qt, QPoint, QTimer, pyqtSignal
-from PyQt5.QtGui import QPixmap, QPainter, QColor
+from PyQt5.QtWidgets import QWidget, QMenu, QAction
+from PyQt5.QtCore import Qt, QPoint, QRect, QTimer, QEvent, pyqtSignal
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QColor, QRegion
 import random
+import time
 
 from config import config
 from animation import AnimationManager
+from frame_cache import FrameCache
+from frame_loader import FrameLoader
+from frame_store import SCALES, size_for_scale
+from hit_mask import HitMaskCache
+from scheduler import scheduler
 from behavior import BehaviorManager, PetState
 from sound import SoundManager
 from dialog import DialogBubble
+from power import PowerMonitor
+from governor import FrameRateGovernor
+from startup_profile import profile
+
+class PetResources:
+    # 同一进程中的多只桌宠共用的帧缓存、解码线程、音效和空闲检测（定时器统一由 scheduler 调度），
+    # 多加一只桌宠只增加它自己的帧
+    def __init__(self):
+        self.frame_cache = FrameCache(config.get("frame_cache_mb", 128) * 1024 * 1024)
+        self.source_cache = FrameCache(config.get("source_cache_mb", 32) * 1024 * 1024)
+        self.hit_masks = HitMaskCache(config.get("hit_mask_cache_mb", 8) * 1024 * 1024)
+        self.warm_cache = FrameCache(config.get("warm_cache_mb", 32) * 1024 * 1024,
+                                     cost=lambda packed: packed.cost)
+        self.actions_in_use = {}  # 各桌宠正在播放或预取的动作，见 AnimationManager.in_use
+        self.loader = FrameLoader()
+        self.sound_manager = SoundManager(config.sounds_dir, config.get("sound_buffer", 512))
+        # 音效只有一份，开关和音量是全局设置，只从外层配置读取
+        self.sound_manager.set_enabled(config.get("sound_enabled", True))
+        self.sound_manager.set_volume(config.get("volume", 0.5))
+        self.power_monitor = PowerMonitor(config.get("idle_after_s", 300))
+    
+    def shutdown(self):
+        self.power_monitor.stop()
+        self.loader.shutdown()
+        self.sound_manager.shutdown()
 
 class Pet(QWidget):
-    BASE_WIDTH = 350
-    BASE_HEIGHT = 420
+    SCALES = SCALES  # 右键菜单中可选的人物比例
+    size_for_scale = staticmethod(size_for_scale)
     
     quit_requested = pyqtSignal()
+    first_frame_shown = pyqtSignal()
     
-    def __init__(self):
+    def __init__(self, settings=None, resources: PetResources = None):
         super().__init__()
         
-        self.scale = config.get("scale", 1.0)
-        self.PET_WIDTH = int(self.BASE_WIDTH * self.scale)
-        self.PET_HEIGHT = int(self.BASE_HEIGHT * self.scale)
+        # settings 为这只桌宠的配置（根配置或多桌宠模式下的分节），resources 为共享资源
+        self.settings = settings if settings is not None else config
+        self._owns_resources = resources is None
+        self.resources = resources if resources is not None else PetResources()
+        
+        self.scale = self.settings.get("scale", 1.0)
+        self.PET_WIDTH, self.PET_HEIGHT = self.size_for_scale(self.scale)
         
         self.drag_position = QPoint()
         self.is_dragging = False
@@ -28,10 +64,13 @@ class Pet(QWidget):
         self.click_count = 0
         self.is_playing_angry = False
         self.saved_anim_state = None  # 记录交互前的动画状态 (name, frame, loop, is_click)
-        self.click_reset_timer = QTimer()
+        self.click_reset_timer = scheduler.timer()
         self.click_reset_timer.setSingleShot(True)
         self.click_reset_timer.timeout.connect(self._reset_click_count)
         self.is_click_animation = False  # 标记是否正在播放点击触发的动画
+        self._press_on_pet = False  # 左键是否按在人物的不透明像素上
+        self._clicked_at = None  # 触发点击音效的鼠标事件开始处理的时刻，用于统计点击到出声的延迟
+        self._mask_state = None  # 当前窗口遮罩：(整帧坐标中的区域, 帧在窗口中的偏移)
         
         self._setup_window()
         self._setup_components()
@@ -49,10 +88,6 @@ class Pet(QWidget):
         self.setAttribute(Qt.WA_TranslucentBackground)
         self.setFixedSize(self.PET_WIDTH, self.PET_HEIGHT)
         
-        self.image_label = QLabel(self)
-        self.image_label.setFixedSize(self.PET_WIDTH, self.PET_HEIGHT)
-        self.image_label.setAlignment(Qt.AlignCenter)
-        
         self._set_placeholder_image()
     
     def _set_placeholder_image(self):
@@ -75,43 +110,75 @@ class Pet(QWidget):
         
         painter.end()
         
-        self.image_label.setPixmap(pixmap)
         self.placeholder_pixmap = pixmap
     
     def _setup_components(self):
+        self.frame_cache = self.resources.frame_cache
+        self.source_cache = self.resources.source_cache
         self.animation_manager = AnimationManager(
-            config.animations_dir, 
+            self.settings.animations_dir, 
             self.PET_WIDTH,
-            self.PET_HEIGHT
+            self.PET_HEIGHT,
+            cache=self.frame_cache,
+            loader=self.resources.loader,
+            source_cache=self.source_cache,
+            first_action="站立",
+            hit_masks=self.resources.hit_masks,
+            warm_cache=self.resources.warm_cache,
+            in_use=self.resources.actions_in_use
         )
+        profile.mark("animation_index")
         
         self.behavior_manager = BehaviorManager(self.PET_WIDTH, self.PET_HEIGHT)
         
-        self.sound_manager = SoundManager(config.sounds_dir)
-        
+        # 音效和对话在首帧显示之后再加载，见 deferred_steps
+        self.sound_manager = self.resources.sound_manager
         self.dialog_bubble = DialogBubble()
-        self.dialog_bubble.set_dialogs(config.load_dialogs())
+        self._first_frame_done = False
+        
+        self.power_monitor = self.resources.power_monitor
+        self.governor = FrameRateGovernor(self.settings.get("cpu_budget_pct", 10) / 100)
+        self.paint_time = 0.0  # paintEvent 累计耗时（秒）
+        self._watching_expose = False
     
     def _connect_signals(self):
         self.animation_manager.frame_changed.connect(self._on_frame_changed)
+        self.animation_manager.hit_mask_ready.connect(self._update_input_mask)
         self.animation_manager.animation_finished.connect(self._on_animation_finished)
         
         self.behavior_manager.state_changed.connect(self._on_state_changed)
         self.behavior_manager.position_changed.connect(self._on_position_changed)
         self.behavior_manager.request_dialog.connect(self._show_dialog)
+        
+        self.power_monitor.idle_changed.connect(self._on_idle_changed)
+        self.governor.limit_changed.connect(self._on_governor_limit)
     
     def _load_config(self):
-        x = config.get("pet_x", 100)
-        y = config.get("pet_y", 100)
+        x = self.settings.get("pet_x", 100)
+        y = self.settings.get("pet_y", 100)
         self.move(x, y)
         self.behavior_manager.set_position(x, y)
         
-        self.sound_manager.set_enabled(config.get("sound_enabled", True))
-        self.sound_manager.set_volume(config.get("volume", 0.5))
-        
-        self.behavior_manager.set_enabled(config.get("auto_walk", True))
+        self.behavior_manager.set_enabled(self.settings.get("auto_walk", True))
+        # 对话气泡开关由托盘统一控制，与音效一样是全局设置
         self.dialog_bubble.set_enabled(config.get("dialog_enabled", True))
     
+    def deferred_steps(self) -> list:
+        # 首帧显示后在事件循环中逐个执行的初始化步骤
+        return [
+            self.animation_manager.index_remaining,
+            self._load_sounds,
+            self._load_dialogs,
+        ]
+    
+    def _load_sounds(self):
+        self.sound_manager.load()
+        profile.mark("sound_ready")
+    
+    def _load_dialogs(self):
+        self.dialog_bubble.set_dialogs(self.settings.load_dialogs())
+        profile.mark("dialogs_ready")
+    
     def _start(self):
         if self.animation_manager.has_animation("站立"):
             self.animation_manager.play("站立")
@@ -120,9 +187,105 @@ class Pet(QWidget):
         
         self.behavior_manager.start_idle()
     
-    def _on_frame_changed(self, pixmap: QPixmap):
-        if not pixmap.isNull():
-            self.image_label.setPixmap(pixmap)
+    def _on_frame_changed(self, image: QImage, dirty: QRect):
+        # 帧由动画管理器持有，这里只登记需要重绘的区域，在 paintEvent 中绘制
+        if dirty.isNull():
+            self.update()
+        else:
+            self.update(dirty.translated(self._frame_offset()))
+        self._update_input_mask()
+    
+    def _update_input_mask(self):
+        # 窗口只在人物的不透明像素上接收鼠标，透明部分的点击直接落到下面的窗口或桌面；
+        # 位图在解码线程中生成并缓存，换帧只是换一个现成的区域
+        if not self.settings.get("click_through", True):
+            region = None
+        else:
+            region = self._input_region()
+        # 区域和位置都没变时不重设遮罩（setMask 会让窗口系统重新计算形状）
+        state = None if region is None else (region, self._frame_offset())
+        if state == self._mask_state:
+            return
+        self._mask_state = state
+        if state is None:
+            self.clearMask()
+        else:
+            self.setMask(region.translated(state[1]))
+    
+    def _input_region(self):
+        # 当前帧的输入区域（整帧坐标）；还没有帧时返回 None，整个窗口都接收鼠标
+        manager = self.animation_manager
+        if manager.current_image is None:
+            return None
+        mask = manager.current_hit_mask()
+        if mask is not None:
+            region = mask.region()
+        else:
+            # 这一帧的位图还在后台生成，生成好之后会再次调用；遮罩同时裁剪绘制，
+            # 所以先用上一帧的区域并上这一帧的内容范围，只会偏大，不会裁掉新帧的像素
+            region = QRegion(manager.current_content_rect())
+            if self._mask_state is not None:
+                region = region.united(self._mask_state[0])
+        if region.isEmpty():
+            # 空区域会被当作取消遮罩，全透明的帧保留一个像素
+            region = QRegion(0, 0, 1, 1)
+        return region
+    
+    def _hit_test(self, pos: QPoint) -> bool:
+        # 点在当前帧的不透明像素上时返回 True；没有帧（占位图）时整个窗口都算
+        if not self.settings.get("click_through", True):
+            return True
+        offset = self._frame_offset()
+        x, y = pos.x() - offset.x(), pos.y() - offset.y()
+        mask = self.animation_manager.current_hit_mask()
+        if mask is not None:
+            return mask.contains(x, y)
+        # 位图还没生成好时按窗口当前的输入区域判断
+        return self._mask_state is None or self._mask_state[0].contains(QPoint(x, y))
+    
+    def _frame_offset(self) -> QPoint:
+        # 整帧尺寸与窗口不一致时（例如切换比例的瞬间）居中显示
+        am = self.animation_manager
+        return QPoint((self.width() - am.width) // 2, (self.height() - am.height) // 2)
+    
+    def _frame_origin(self) -> QPoint:
+        # 当前帧只保存了非透明部分，按它在整帧中的位置绘制
+        return self._frame_offset() + self.animation_manager.current_rect.topLeft()
+    
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        painter = QPainter(self)
+        image = self.animation_manager.current_image
+        if image is None:
+            painter.drawPixmap(0, 0, self.placeholder_pixmap)
+        else:
+            painter.drawImage(self._frame_origin(), image)
+            if not self._first_frame_done:
+                self._first_frame_done = True
+                profile.mark("first_frame")
+                QTimer.singleShot(0, self.first_frame_shown.emit)
+        painter.end()
+        self.paint_time += time.perf_counter() - start
+        
+        # 渲染开销超出预算时逐级降低帧率，有余量时再升回去
+        am = self.animation_manager
+        if am.current_animation is not None:
+            self.governor.sample(am.busy_time + self.paint_time, am.effective_fps,
+                                 am.frame_fps(am.current_animation, limited=False))
+    
+    def metrics(self) -> dict:
+        return {
+            "character": self.settings.get("character", "firefly"),
+            "scale": self.scale,
+            "visible": self.isVisible(),
+            "paint_ms": round(self.paint_time * 1000, 1),  # paintEvent 累计耗时
+            "governor": {"limit": self.governor.limit, "load": round(self.governor.load, 3)},
+            "animation": self.animation_manager.metrics(),
+            "behavior": self.behavior_manager.metrics(),
+        }
+    
+    def _on_governor_limit(self, fps):
+        self.animation_manager.set_fps_limit("governor", fps)
     
     def _on_animation_finished(self, name: str):
         # 如果是“气鼓鼓”播放完，重置状态并恢复
@@ -147,7 +310,7 @@ class Pet(QWidget):
         if self.is_click_animation:
             self.is_click_animation = False
 
-        mode = config.get("animation_mode", "random")
+        mode = self.settings.get("animation_mode", "random")
         if mode == "random":
             # 随机模式下，一个动画播完自动播下一个
             self.animation_manager.play_random(loop_override=False)
@@ -170,7 +333,7 @@ class Pet(QWidget):
             return
 
         anim_name = self.behavior_manager.get_animation_name()
-        mode = config.get("animation_mode", "random")
+        mode = self.settings.get("animation_mode", "random")
         
         # 拖动状态特殊处理
         if state == PetState.DRAGGING:
@@ -195,7 +358,8 @@ class Pet(QWidget):
             self.animation_manager.play("站立", loop_override=loop)
         
         if state == PetState.CLICKING:
-            self.sound_manager.play("click")
+            self.sound_manager.play("click", requested_at=self._clicked_at)
+            self._clicked_at = None
         elif state in [PetState.WALKING_LEFT, PetState.WALKING_RIGHT]:
             self.sound_manager.play("walk")
     
@@ -221,6 +385,8 @@ class Pet(QWidget):
                 "loop": curr.loop,
                 "is_click": self.is_click_animation
             }
+            # 之后大概率会恢复到这个状态，提前在后台解码
+            self.animation_manager.prefetch(curr.name, curr.current_frame)
 
     def _restore_animation_state(self):
         if not self.saved_anim_state:
@@ -236,15 +402,62 @@ class Pet(QWidget):
             start_frame=state["frame"]
         )
     
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 窗口被完全遮挡时系统会发送 Expose 事件，借此暂停动画
+        window = self.windowHandle()
+        if window is not None and not self._watching_expose:
+            window.installEventFilter(self)
+            self._watching_expose = True
+        self._update_power_state()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._update_power_state()
+    
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self._update_power_state()
+    
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Expose and obj is self.windowHandle():
+            self._update_power_state()
+        return super().eventFilter(obj, event)
+    
+    def _update_power_state(self):
+        # 看不见桌宠时（隐藏、最小化、被完全遮挡）暂停帧时钟和行为定时器，重新可见时从原来的帧继续
+        window = self.windowHandle()
+        visible = self.isVisible() and not self.isMinimized() \
+            and (window is None or window.isExposed())
+        if visible:
+            self.animation_manager.resume()
+            self.behavior_manager.resume()
+        else:
+            self.animation_manager.pause()
+            self.behavior_manager.pause()
+    
+    def _on_idle_changed(self, idle: bool):
+        # 长时间没有输入时降低帧率
+        fps = self.settings.get("idle_fps", 6) if idle else None
+        self.animation_manager.set_fps_limit("idle", fps)
+    
     def mousePressEvent(self, event):
+        self.power_monitor.notify_input()
+        if not self._hit_test(event.pos()):
+            # 输入区域还没来得及更新（或者平台不支持）时，透明处的点击不算点到人物
+            self._press_on_pet = False
+            event.ignore()
+            return
         if event.button() == Qt.LeftButton:
+            self._press_on_pet = True
             self.is_dragging = False
             self.mouse_press_pos = event.globalPos()
             self.drag_position = event.globalPos() - self.frameGeometry().topLeft()
             event.accept()
     
     def mouseMoveEvent(self, event):
-        if event.buttons() == Qt.LeftButton:
+        if event.buttons() == Qt.LeftButton and self._press_on_pet:
             # 只有移动距离超过阈值才认为是拖动
             if not self.is_dragging:
                 if (event.globalPos() - self.mouse_press_pos).manhattanLength() > 5:
@@ -259,20 +472,23 @@ class Pet(QWidget):
                 event.accept()
     
     def mouseReleaseEvent(self, event):
-        if event.button() == Qt.LeftButton:
+        released_at = time.perf_counter()
+        if event.button() == Qt.LeftButton and self._press_on_pet:
+            self._press_on_pet = False
             if self.is_dragging:
                 self.is_dragging = False
                 self.behavior_manager.stop_dragging()
                 
                 pos = self.pos()
-                config.set("pet_x", pos.x())
-                config.set("pet_y", pos.y())
+                self.settings.set("pet_x", pos.x())
+                self.settings.set("pet_y", pos.y())
             else:
                 # 认为是单击
-                self._handle_click()
+                self._handle_click(released_at)
             event.accept()
 
-    def _handle_click(self):
+    def _handle_click(self, clicked_at: float = None):
+        # clicked_at: 鼠标事件开始处理的时刻，切换动画等点击处理的耗时也计入音效延迟
         # 如果正在播放“气鼓鼓”，则不响应任何点击事件（互斥）
         if self.is_playing_angry:
             return
@@ -287,34 +503,39 @@ class Pet(QWidget):
             self.is_playing_angry = True
             self.is_click_animation = True
             self.animation_manager.play("气鼓鼓", loop_override=False)
-            self.sound_manager.play("click")
+            self.sound_manager.play("click", requested_at=clicked_at)
             # 多次点击事件触发后，不执行单次点击的对话逻辑（或者执行特定的）
         else:
             # 单次点击事件：播放随机动画并显示对话
             self.is_click_animation = True
             self.animation_manager.play_random(loop_override=False)
-            self.sound_manager.play("click")
+            self.sound_manager.play("click", requested_at=clicked_at)
             self._show_dialog()
     
     def mouseDoubleClickEvent(self, event):
-        if event.button() == Qt.LeftButton:
+        clicked_at = time.perf_counter()
+        if event.button() == Qt.LeftButton and self._hit_test(event.pos()):
+            self._clicked_at = clicked_at
             self.behavior_manager.trigger_click()
             self._show_dialog()
             event.accept()
     
     def contextMenuEvent(self, event):
+        if not self._hit_test(event.pos()):
+            event.ignore()
+            return
         menu = QMenu(self)
         
         # 动画模式子菜单
         mode_menu = menu.addMenu("动画模式")
         
         keep_action = QAction("保持", mode_menu, checkable=True)
-        keep_action.setChecked(config.get("animation_mode") == "keep")
+        keep_action.setChecked(self.settings.get("animation_mode") == "keep")
         keep_action.triggered.connect(lambda: self._set_animation_mode("keep"))
         mode_menu.addAction(keep_action)
         
         random_action = QAction("随机", mode_menu, checkable=True)
-        random_action.setChecked(config.get("animation_mode") == "random")
+        random_action.setChecked(self.settings.get("animation_mode") == "random")
         random_action.triggered.connect(lambda: self._set_animation_mode("random"))
         mode_menu.addAction(random_action)
         
@@ -322,8 +543,7 @@ class Pet(QWidget):
         
         # 人物比例子菜单
         scale_menu = menu.addMenu("人物比例")
-        scales = [0.5, 0.75, 1.0, 1.25, 1.5, 2.0]
-        for s in scales:
+        for s in self.SCALES:
             scale_action = QAction(f"{int(s*100)}%", scale_menu, checkable=True)
             scale_action.setChecked(abs(self.scale - s) < 0.01)
             scale_action.triggered.connect(lambda checked, val=s: self._set_scale(val))
@@ -359,7 +579,7 @@ class Pet(QWidget):
         menu.exec_(event.globalPos())
 
     def _set_animation_mode(self, mode: str):
-        config.set("animation_mode", mode)
+        self.settings.set("animation_mode", mode)
         # 如果切换到保持模式，当前动画应该循环
         if mode == "keep":
             if self.animation_manager.current_animation:
@@ -378,7 +598,7 @@ class Pet(QWidget):
         
         # 播放指定的动画
         # 模式参考：如果当前是保持模式，则循环播放该动作
-        loop = (config.get("animation_mode") == "keep")
+        loop = (self.settings.get("animation_mode") == "keep")
         self.animation_manager.play(name, loop_override=loop)
 
     def _set_scale(self, scale: float):
@@ -386,15 +606,13 @@ class Pet(QWidget):
             return
             
         self.scale = scale
-        config.set("scale", scale)
+        self.settings.set("scale", scale)
         
         # 更新实际尺寸
-        self.PET_WIDTH = int(self.BASE_WIDTH * scale)
-        self.PET_HEIGHT = int(self.BASE_HEIGHT * scale)
+        self.PET_WIDTH, self.PET_HEIGHT = self.size_for_scale(scale)
         
         # 调整窗口大小
         self.setFixedSize(self.PET_WIDTH, self.PET_HEIGHT)
-        self.image_label.setFixedSize(self.PET_WIDTH, self.PET_HEIGHT)
         
         # 通知动画管理器更新
         self.animation_manager.update_size(self.PET_WIDTH, self.PET_HEIGHT)
@@ -410,19 +628,15 @@ class Pet(QWidget):
         else:
             self.show()
     
-    def set_sound(self, enabled: bool):
-        self.sound_manager.set_enabled(enabled)
-        config.set("sound_enabled", enabled)
-    
     def set_dialog(self, enabled: bool):
         self.dialog_bubble.set_enabled(enabled)
-        config.set("dialog_enabled", enabled)
     
     def cleanup(self):
         pos = self.pos()
-        config.set("pet_x", pos.x())
-        config.set("pet_y", pos.y())
+        self.settings.set("pet_x", pos.x())
+        self.settings.set("pet_y", pos.y())
         
-        self.animation_manager.stop()
-        self.sound_manager.stop_all()
+        self.animation_manager.shutdown()
+        if self._owns_resources:
+            self.resources.shutdown()
         self.dialog_bubble.hide()
@@ -0,0 +1,69 @@
+from PyQt5.QtCore import QObject, pyqtSignal, Qt
+from PyQt5.QtGui import QCursor
+import ctypes
+import sys
+import time
+
+from scheduler import scheduler
+
+class _LastInputInfo(ctypes.Structure):
+    _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+def system_idle_seconds():
+    # Windows 下读取系统级的最后输入时间，其它平台返回 None
+    if sys.platform != "win32":
+        return None
+    try:
+        info = _LastInputInfo()
+        info.cbSize = ctypes.sizeof(info)
+        if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        ticks = ctypes.windll.kernel32.GetTickCount()
+        return ((ticks - info.dwTime) & 0xFFFFFFFF) / 1000.0
+    except Exception:
+        return None
+
+class PowerMonitor(QObject):
+    idle_changed = pyqtSignal(bool)
+
+    POLL_MS = 5000  # 空闲检测的轮询间隔，使用粗粒度定时器，不额外唤醒系统
+
+    def __init__(self, idle_after: float = 300):
+        super().__init__()
+        self.idle_after = idle_after  # 多少秒没有输入算空闲，0 表示不检测
+        self.idle = False
+        self._last_input = time.monotonic()
+        self._last_cursor = QCursor.pos()
+
+        self.timer = scheduler.timer()
+        self.timer.setTimerType(Qt.VeryCoarseTimer)
+        self.timer.timeout.connect(self._poll)
+        if idle_after > 0:
+            self.timer.start(self.POLL_MS)
+
+    def notify_input(self):
+        # 与桌宠本身的交互立即结束空闲，不等下一次轮询
+        self._last_input = time.monotonic()
+        self._set_idle(False)
+
+    def idle_seconds(self) -> float:
+        seconds = system_idle_seconds()
+        if seconds is not None:
+            return seconds
+        # 没有系统接口时以鼠标是否移动近似判断
+        pos = QCursor.pos()
+        if pos != self._last_cursor:
+            self._last_cursor = pos
+            self._last_input = time.monotonic()
+        return time.monotonic() - self._last_input
+
+    def _poll(self):
+        self._set_idle(self.idle_seconds() >= self.idle_after)
+
+    def _set_idle(self, idle: bool):
+        if idle != self.idle:
+            self.idle = idle
+            self.idle_changed.emit(idle)
+
+    def stop(self):
+        self.timer.stop()
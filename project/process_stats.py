@@ -0,0 +1,55 @@
+import ctypes
+import os
+import sys
+
+# 不依赖 Qt 的进程统计小工具：耗时分位数和进程内存，
+# 供运行时性能指标 (metrics.py)、动画管理器和基准脚本共用
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    # Windows 的 PROCESS_MEMORY_COUNTERS
+    _fields_ = [("cb", ctypes.c_uint32), ("PageFaultCount", ctypes.c_uint32),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+def _windows_memory_counters():
+    counters = _ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        return counters
+    return None
+
+def process_rss_bytes() -> int:
+    # 进程当前占用的物理内存；读取失败时返回 0
+    try:
+        if sys.platform == "win32":
+            counters = _windows_memory_counters()
+            return counters.WorkingSetSize if counters is not None else 0
+        if os.path.exists("/proc/self/statm"):
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        # 其它平台只能取到峰值
+        return peak_rss_bytes()
+    except Exception:
+        return 0
+
+def peak_rss_bytes() -> int:
+    # 进程占用物理内存的峰值；读取失败时返回 0
+    try:
+        if sys.platform == "win32":
+            counters = _windows_memory_counters()
+            return counters.PeakWorkingSetSize if counters is not None else 0
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以 KB 为单位，macOS 以字节为单位
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return 0
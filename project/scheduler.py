@@ -0,0 +1,183 @@
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+from collections import deque
+import heapq
+import math
+import time
+
+class SchedulerTimer(QObject):
+    # 用法与 QTimer 相同，但由全局的 Scheduler 统一唤醒
+    timeout = pyqtSignal()
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self._scheduler = scheduler
+        self._single_shot = False
+        self._interval = 0
+        self._timer_type = Qt.CoarseTimer  # 与 QTimer 的默认值相同
+        self._due = None  # 到期时刻（perf_counter），未启动时为 None
+        self._generation = 0  # 每次启动或停止加一，使队列中旧的条目失效
+
+    def setSingleShot(self, single_shot: bool):
+        self._single_shot = single_shot
+
+    def isSingleShot(self) -> bool:
+        return self._single_shot
+
+    def setTimerType(self, timer_type):
+        self._timer_type = timer_type
+
+    def setInterval(self, msec: int):
+        self._interval = msec
+
+    def interval(self) -> int:
+        return self._interval
+
+    def start(self, msec: int = None):
+        if msec is not None:
+            self._interval = msec
+        self._scheduler._schedule(self, time.perf_counter() + self._interval / 1000)
+
+    def stop(self):
+        self._scheduler._cancel(self)
+
+    def isActive(self) -> bool:
+        return self._due is not None
+
+    def remainingTime(self) -> int:
+        if self._due is None:
+            return -1
+        return max(0, math.ceil((self._due - time.perf_counter()) * 1000))
+
+    def slack(self) -> float:
+        # 允许推迟触发的时间（秒），用来和其它定时器合并唤醒；任何定时器都不会提前触发
+        if self._timer_type == Qt.PreciseTimer:
+            return 0.0
+        if self._timer_type == Qt.VeryCoarseTimer:
+            return 0.5
+        return self._interval * 0.05 / 1000
+
+class Scheduler(QObject):
+    # 进程中所有定时器共用一个精确定时器，按截止时间排在优先队列中，
+    # 进程只在确实有定时器到期时才被唤醒，可以推迟的定时器会和其它到期的合并在一次唤醒中
+    EPSILON = 0.0005  # 视为已经到期的提前量（秒）
+    RATE_WINDOW = 5.0  # 统计每秒唤醒次数的时间窗口（秒）
+
+    def __init__(self):
+        super().__init__()
+        self._queue = []  # [(最晚触发时刻, 序号, 代数, 定时器)]
+        self._seq = 0
+        self._timer = None  # QApplication 创建之后才能使用定时器，第一次调度时再创建
+        self.wakeups = 0
+        self.fired = 0
+        self.coalesced = 0  # 与其它定时器合并在同一次唤醒中触发的次数
+        self._wake_times = deque()
+
+    def timer(self) -> SchedulerTimer:
+        return SchedulerTimer(self)
+
+    def single_shot(self, msec: int, callback):
+        # 对应 QTimer.singleShot
+        timer = SchedulerTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(callback)
+        timer.timeout.connect(timer.deleteLater)
+        timer.start(msec)
+        return timer
+
+    def _schedule(self, timer: SchedulerTimer, due: float):
+        timer._generation += 1
+        timer._due = due
+        self._seq += 1
+        heapq.heappush(self._queue, (due + timer.slack(), self._seq, timer._generation, timer))
+        self._rearm()
+
+    def _cancel(self, timer: SchedulerTimer):
+        if timer._due is None:
+            return
+        timer._generation += 1
+        timer._due = None
+        self._rearm()
+
+    def _live(self, entry) -> bool:
+        return entry[3]._generation == entry[2]
+
+    def _rearm(self):
+        queue = self._queue
+        while queue and not self._live(queue[0]):
+            heapq.heappop(queue)
+        if self._timer is None:
+            if not queue:
+                return
+            self._timer = QTimer()
+            self._timer.setTimerType(Qt.PreciseTimer)
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self._fire)
+        if not queue:
+            self._timer.stop()
+            return
+        # 在最早的截止时刻之前，等到尽量多的定时器到期再一起唤醒
+        latest = queue[0][0]
+        wake = max(entry[3]._due for entry in queue if self._live(entry) and entry[3]._due <= latest)
+        delay = math.ceil((wake - time.perf_counter()) * 1000)
+        self._timer.start(max(0, delay))
+
+    def _fire(self):
+        now = time.perf_counter()
+        self.wakeups += 1
+        self._wake_times.append(now)
+        while self._wake_times[0] < now - self.RATE_WINDOW:
+            self._wake_times.popleft()
+
+        due = []
+        remaining = []
+        for entry in self._queue:
+            if not self._live(entry):
+                continue
+            if entry[3]._due <= now + self.EPSILON:
+                due.append(entry[3])
+            else:
+                remaining.append(entry)
+        self._queue = remaining
+        heapq.heapify(self._queue)
+
+        # 先把重复的定时器重新排队再发信号，回调中可以随意启动或停止定时器；
+        # 记下此时的代数，被同一批中较早的回调停止或重新启动的定时器不再触发，与 QTimer 一致
+        batch = []
+        for timer in due:
+            if not timer._single_shot:
+                self._schedule(timer, max(now, timer._due + timer._interval / 1000))
+            batch.append((timer, timer._generation))
+        emitted = 0
+        for timer, generation in batch:
+            if timer._generation != generation or timer._due is None:
+                continue
+            if timer._single_shot:
+                # 单次定时器在触发时才变为未启动
+                timer._generation += 1
+                timer._due = None
+            emitted += 1
+            timer.timeout.emit()
+        self.fired += emitted
+        self.coalesced += max(0, emitted - 1)
+        self._rearm()
+
+    @property
+    def active_timers(self) -> int:
+        return len({id(entry[3]) for entry in self._queue if self._live(entry)})
+
+    def wakeups_per_second(self) -> float:
+        now = time.perf_counter()
+        while self._wake_times and self._wake_times[0] < now - self.RATE_WINDOW:
+            self._wake_times.popleft()
+        return len(self._wake_times) / self.RATE_WINDOW
+
+    def stats(self) -> dict:
+        return {
+            "active_timers": self.active_timers,
+            "wakeups": self.wakeups,
+            "fired": self.fired,
+            "coalesced": self.coalesced,
+            "wakeups_per_s": round(self.wakeups_per_second(), 2),
+        }
+
+scheduler = Scheduler()
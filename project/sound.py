@@ -1,61 +1,213 @@
 from pathlib import Path
+from collections import OrderedDict, deque
+import threading
+import time
 
 class SoundManager:
-    def __init__(self, sounds_dir: Path):
+    EXTENSIONS = [".wav", ".mp3", ".ogg"]
+    CACHE_SIZE = 8  # 最多保留的已解码音效数
+    RELEASE_AFTER = 60  # 静音这么多秒之后释放混音器
+    # 每类音效独占一个保留通道，连续触发时新的直接替换旧的，不和其它音效抢通道
+    CHANNELS = {"click": 0, "dialog": 1, "walk": 2}
+    
+    def __init__(self, sounds_dir: Path, buffer_size: int = 512):
         self.sounds_dir = sounds_dir
         self.enabled = True
         self.volume = 0.5
-        self.sounds = {}
+        self.buffer_size = buffer_size  # 混音器缓冲区采样数，越小延迟越低
+        self.buffer_ms = 0.0  # 缓冲区对应的输出延迟
+        self.files = {}  # 音效名 -> 文件路径
+        self.sounds = OrderedDict()  # 已解码的音效，按最近使用排序，只在音频线程中访问
+        self.latencies = deque(maxlen=100)  # 最近的点击到开始播放的耗时（秒），不含初始化混音器的那一次
+        self.first_play_latency = None  # 需要先初始化混音器的播放（第一次，或释放后重新初始化）的耗时
+        self.plays = 0  # 交给音频线程播放的次数
         self._mixer_initialized = False
+        self._mixer_failed = False
+        self.loaded = False
         
-        self._init_mixer()
-        self._load_sounds()
+        # GUI 线程只往队列里追加命令（deque 的 append/popleft 是原子的），混音器只在音频线程中使用
+        self._commands = deque()
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def load(self):
+        # 只登记音效文件；pygame 和混音器在第一次播放时才初始化，音效在第一次使用时才解码
+        if self.loaded:
+            return
+        self.loaded = True
+        if not self.sounds_dir.exists():
+            return
+        for file in self.sounds_dir.iterdir():
+            if file.suffix.lower() in self.EXTENSIONS:
+                self.files[file.stem] = file
+    
+    def _send(self, command: tuple):
+        if self._thread is None:
+            # 音频线程在第一次需要时才启动
+            self._thread = threading.Thread(target=self._run, name="sound", daemon=True)
+            self._thread.start()
+        self._commands.append(command)
+        self._wake.set()
     
-    def _init_mixer(self):
+    def _run(self):
+        while True:
+            # 混音器未初始化时一直阻塞，不产生任何唤醒
+            timeout = self.RELEASE_AFTER if self._mixer_initialized else None
+            woke = self._wake.wait(timeout)
+            self._wake.clear()
+            if not woke and not self._commands:
+                self._release_if_idle()
+                continue
+            while self._commands:
+                command = self._commands.popleft()
+                if command[0] == "quit":
+                    self._release()
+                    return
+                self._handle(command)
+    
+    def _handle(self, command: tuple):
+        if command[0] == "play":
+            self._play(*command[1:])
+        elif command[0] == "stop":
+            if self._mixer_initialized:
+                try:
+                    import pygame
+                    pygame.mixer.stop()
+                except Exception:
+                    pass
+        elif command[0] == "release":
+            self._release()
+    
+    def _init_mixer(self) -> bool:
+        if self._mixer_initialized:
+            return True
+        if self._mixer_failed:
+            return False
         try:
             import pygame
-            pygame.mixer.init()
+            pygame.mixer.init(buffer=self.buffer_size)
+            pygame.mixer.set_reserved(len(self.CHANNELS))
+            frequency = pygame.mixer.get_init()[0]
+            self.buffer_ms = self.buffer_size / frequency * 1000
             self._mixer_initialized = True
         except Exception as e:
             print(f"音效初始化失败: {e}")
-            self._mixer_initialized = False
+            self._mixer_failed = True
+        return self._mixer_initialized
     
-    def _load_sounds(self):
-        if not self._mixer_initialized or not self.sounds_dir.exists():
-            return
+    def _get_sound(self, name: str):
+        sound = self.sounds.get(name)
+        if sound is not None:
+            self.sounds.move_to_end(name)
+            return sound
         
         import pygame
-        extensions = [".wav", ".mp3", ".ogg"]
-        
-        for file in self.sounds_dir.iterdir():
-            if file.suffix.lower() in extensions:
-                try:
-                    sound = pygame.mixer.Sound(str(file))
-                    self.sounds[file.stem] = sound
-                except Exception as e:
-                    print(f"加载音效失败 {file.name}: {e}")
+        file = self.files[name]
+        try:
+            sound = pygame.mixer.Sound(str(file))
+        except Exception as e:
+            print(f"加载音效失败 {file.name}: {e}")
+            self.files.pop(name, None)
+            return None
+        self.sounds[name] = sound
+        while len(self.sounds) > self.CACHE_SIZE:
+            self.sounds.popitem(last=False)
+        return sound
     
-    def play(self, name: str):
-        if not self.enabled or not self._mixer_initialized:
+    def _play(self, name: str, volume: float, requested_at: float):
+        cold = not self._mixer_initialized
+        if not self._init_mixer():
             return
-        
-        if name in self.sounds:
+        sound = self._get_sound(name)
+        if sound is None:
+            return
+        try:
+            import pygame
+            channel = self.CHANNELS.get(name)
+            if channel is not None:
+                channel = pygame.mixer.Channel(channel)
+                channel.set_volume(volume)
+                channel.play(sound)
+            else:
+                sound.set_volume(volume)
+                sound.play()
+        except Exception:
+            return
+        if requested_at is None:
+            return
+        latency = time.perf_counter() - requested_at
+        if cold:
+            # 初始化混音器要几十到上百毫秒，单独记录，不拉高平均延迟
+            self.first_play_latency = latency
+        else:
+            self.latencies.append(latency)
+    
+    def _release_if_idle(self):
+        try:
+            import pygame
+            busy = self._mixer_initialized and pygame.mixer.get_busy()
+        except Exception:
+            busy = False
+        if not busy:
+            self._release()
+    
+    def _release(self):
+        # 释放混音器和已解码的音效，下次播放时重新初始化
+        self.sounds.clear()
+        if self._mixer_initialized:
             try:
-                self.sounds[name].set_volume(self.volume)
-                self.sounds[name].play()
+                import pygame
+                pygame.mixer.quit()
             except Exception:
                 pass
+            self._mixer_initialized = False
+    
+    def play(self, name: str, requested_at: float = None):
+        # requested_at 为触发播放的输入事件开始处理的时刻（time.perf_counter），用于统计点击到出声的延迟；
+        # 不是由输入触发的音效（对话、走路）不传，也不计入统计
+        if not self.enabled:
+            return
+        if not self.loaded:
+            self.load()
+        if name not in self.files or self._mixer_failed:
+            return
+        self.plays += 1
+        self._send(("play", name, self.volume, requested_at))
+    
+    def latency_stats(self) -> dict:
+        # 从触发播放的输入事件到开始播放的耗时，加上 buffer_ms（混音器缓冲区的输出延迟）
+        # 近似点击到出声的时间；first_play_ms 包含初始化混音器，不计入平均值
+        samples = list(self.latencies)
+        stats = {"count": len(samples), "buffer_ms": round(self.buffer_ms, 2)}
+        if samples:
+            stats["avg_ms"] = round(sum(samples) / len(samples) * 1000, 2)
+            stats["max_ms"] = round(max(samples) * 1000, 2)
+        if self.first_play_latency is not None:
+            stats["first_play_ms"] = round(self.first_play_latency * 1000, 2)
+        return stats
+    
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "plays": self.plays,
+            "mixer_active": self._mixer_initialized,
+            "latency": self.latency_stats(),
+        }
     
     def set_volume(self, volume: float):
         self.volume = max(0.0, min(1.0, volume))
     
     def set_enabled(self, enabled: bool):
         self.enabled = enabled
+        if not enabled and self._thread is not None:
+            self._send(("release",))
     
     def stop_all(self):
-        if self._mixer_initialized:
-            try:
-                import pygame
-                pygame.mixer.stop()
-            except Exception:
-                pass
+        if self._thread is not None:
+            self._send(("stop",))
+    
+    def shutdown(self):
+        if self._thread is not None:
+            self._send(("quit",))
+            self._thread.join(1.0)
+            self._thread = None
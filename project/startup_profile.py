@@ -0,0 +1,56 @@
+import json
+import time
+
+class StartupProfile:
+    # 记录启动过程中各阶段完成的时刻，用于跟踪首帧时间的变化
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []  # [(阶段名, 距启动的秒数)]
+        self._seen = set()
+        self._waiting = None  # (需要等待的阶段集合, 回调)
+
+    def mark(self, phase: str):
+        # 同一阶段只记录第一次
+        if phase in self._seen:
+            return
+        self._seen.add(phase)
+        self.marks.append((phase, time.perf_counter() - self.start))
+        if self._waiting is not None and self._waiting[0] <= self._seen:
+            callback = self._waiting[1]
+            self._waiting = None
+            callback()
+
+    def when_done(self, phases, callback):
+        # 指定的阶段全部完成后调用一次 callback
+        phases = set(phases)
+        if phases <= self._seen:
+            callback()
+        else:
+            self._waiting = (phases, callback)
+
+    def timeline(self) -> list:
+        result = []
+        previous = 0.0
+        for phase, at in self.marks:
+            result.append({
+                "phase": phase,
+                "at_ms": round(at * 1000, 2),
+                "delta_ms": round((at - previous) * 1000, 2),
+            })
+            previous = at
+        return result
+
+    def report(self, path=None):
+        timeline = self.timeline()
+        print("启动耗时：")
+        for item in timeline:
+            print(f"  {item['phase']:<16} {item['at_ms']:>9.1f} ms  (+{item['delta_ms']:.1f} ms)")
+        if path:
+            data = {"total_ms": timeline[-1]["at_ms"] if timeline else 0, "phases": timeline}
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+            except IOError as e:
+                print(f"写入启动耗时失败: {e}")
+
+profile = StartupProfile()
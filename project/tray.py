@@ -4,10 +4,15 @@ from PyQt5.QtCore import pyqtSignal, QObject
 from pathlib import Path
 
 class TrayManager(QObject):
+    TOOLTIP = "流萤桌面宠物"
+    
     show_hide_toggled = pyqtSignal()
     sound_toggled = pyqtSignal(bool)
     dialog_toggled = pyqtSignal(bool)
     quit_requested = pyqtSignal()
+    metrics_opened = pyqtSignal()
+    metrics_closed = pyqtSignal()
+    copy_metrics_requested = pyqtSignal()
     
     def __init__(self, icon_path: Path = None):
         super().__init__()
@@ -21,7 +26,7 @@ class TrayManager(QObject):
                 QApplication.style().SP_ComputerIcon
             ))
         
-        self.tray.setToolTip("流萤桌面宠物")
+        self.tray.setToolTip(self.TOOLTIP)
         
         self._create_menu()
         
@@ -52,6 +57,16 @@ class TrayManager(QObject):
         )
         self.menu.addAction(self.dialog_action)
         
+        # 性能子菜单：打开期间每秒刷新一次，关闭后不再采集
+        self.metrics_menu = self.menu.addMenu("性能")
+        self.metrics_menu.aboutToShow.connect(self.metrics_opened.emit)
+        self.metrics_menu.aboutToHide.connect(self.metrics_closed.emit)
+        self.metrics_lines = []
+        self.metrics_menu.addSeparator()
+        copy_action = QAction("复制性能数据", self.metrics_menu)
+        copy_action.triggered.connect(self.copy_metrics_requested.emit)
+        self.metrics_menu.addAction(copy_action)
+        
         self.menu.addSeparator()
         
         quit_action = QAction("退出", self.menu)
@@ -75,3 +90,38 @@ class TrayManager(QObject):
     
     def set_dialog(self, enabled: bool):
         self.dialog_action.setChecked(enabled)
+    
+    def set_fps(self, fps: float):
+        # 在提示中显示当前实际帧率
+        status = f"{fps:g} 帧/秒" if fps > 0 else "已暂停"
+        self.tray.setToolTip(f"{self.TOOLTIP}（{status}）")
+    
+    def set_metrics(self, snapshot: dict):
+        lines = []
+        for pet in snapshot["pets"]:
+            anim = pet["animation"]
+            status = f"{anim['fps']:g} 帧/秒" if anim["fps"] > 0 else "已暂停"
+            lines.append(f"{pet['character']}: {status}，帧耗时 p50 {anim['tick_p50_us'] / 1000:.2f} ms"
+                         f" / p99 {anim['tick_p99_us'] / 1000:.2f} ms")
+        caches = snapshot["caches_mb"]
+        lines.append(f"已解码帧: {snapshot['frames_decoded']}")
+        lines.append(f"帧缓存: {caches['frames']} MB（压缩 {caches['compressed']} MB）")
+        lines.append(f"进程内存: {snapshot['rss_mb']} MB")
+        lines.append(f"定时器唤醒: {snapshot['scheduler']['wakeups_per_s']:g} 次/秒")
+        latency = snapshot["sound"]["latency"]
+        if latency["count"]:
+            lines.append(f"音效延迟: 平均 {latency['avg_ms']} ms")
+        if "first_play_ms" in latency:
+            lines.append(f"首次音效延迟: {latency['first_play_ms']} ms（含初始化混音器）")
+        
+        # 行数随桌宠数量变化，多出的行补上，少了的删掉；这些行只用于显示
+        separator = self.metrics_menu.actions()[len(self.metrics_lines)]
+        while len(self.metrics_lines) < len(lines):
+            action = QAction(self.metrics_menu)
+            action.setEnabled(False)
+            self.metrics_menu.insertAction(separator, action)
+            self.metrics_lines.append(action)
+        while len(self.metrics_lines) > len(lines):
+            self.metrics_menu.removeAction(self.metrics_lines.pop())
+        for action, text in zip(self.metrics_lines, lines):
+            action.setText(text)